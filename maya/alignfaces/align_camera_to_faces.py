@@ -1,47 +1,421 @@
+import re
+import math
+from collections import OrderedDict
 import maya.cmds as cmds
-import pymel.core as pm
-
-# faces = list of pm.MeshFace
-def __get_average_center(faces):
-	average = pm.datatypes.Vector()
-	for curr_face in faces:
-		points = curr_face.getPoints(space='world')
-		average += reduce(lambda x, y: x+y, points) / len(points)
-	return average / len(faces)
-
-# faces = list of pm.MeshFace
-def __get_average_normal(faces):
-	average = pm.datatypes.Vector()
-	for curr_face in faces:
-		average += curr_face.getNormal(space='world')
-	return average.normal()
-
-def look_at_selected_faces():
-	# get the active camera
-	active_panel = pm.getPanel(wf=True)
+import maya.api.OpenMaya as om
+try:
+	import numpy as np
+except ImportError:
+	np = None # falls back to pure python geometry
+
+# World-space points and face-vertex connectivity of a mesh, read once through the API.
+# Face f's vertices are connects[offsets[f]:offsets[f]+counts[f]].
+# With numpy these are arrays (points is n x 3), otherwise lists (points of (x, y, z) tuples).
+# Each face's centroid, normal, and area are computed the first time it's asked for and kept.
+class MeshGeometry(object):
+	def __init__(self, points, counts, connects):
+		if None != np:
+			self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+			self.counts = np.asarray(counts, dtype=np.intp)
+			self.connects = np.asarray(connects, dtype=np.intp)
+			self.offsets = np.cumsum(self.counts) - self.counts
+			self.centroids = np.zeros((len(self.counts), 3))
+			self.normals = np.zeros((len(self.counts), 3))
+			self.areas = np.zeros(len(self.counts))
+			self.known = np.zeros(len(self.counts), dtype=bool)
+		else:
+			self.points = [tuple(x) for x in points]
+			self.counts = list(counts)
+			self.connects = list(connects)
+			self.offsets = []
+			total = 0
+			for count in self.counts:
+				self.offsets.append(total)
+				total += count
+			# face => (centroid, normal, area)
+			self.frames = {}
+
+	# (centroids, normals, areas) of the faces, only computing those not asked for before
+	def face_frames(self, faces):
+		if None != np:
+			faces = np.asarray(faces, dtype=np.intp)
+			missing = np.unique(faces[~self.known[faces]])
+			if len(missing):
+				self.centroids[missing], self.normals[missing], self.areas[missing] = face_frames_numpy(self, missing)
+				self.known[missing] = True
+			return (self.centroids[faces], self.normals[faces], self.areas[faces])
+
+		missing = [x for x in set(faces) if x not in self.frames]
+		self.frames.update(zip(missing, zip(*face_frames_python(self, missing))))
+		frames = [self.frames[x] for x in faces]
+		return ([x[0] for x in frames], [x[1] for x in frames], [x[2] for x in frames])
+
+	# points of all vertices of the faces, each once
+	def vertex_points(self, faces):
+		if None != np:
+			return self.points[np.unique(self.connects[face_slots_numpy(self, np.asarray(faces, dtype=np.intp))[0]])]
+		vertices = set()
+		for face in faces:
+			vertices.update(self.connects[self.offsets[face]:self.offsets[face]+self.counts[face]])
+		return [self.points[x] for x in sorted(vertices)]
+
+# mesh = name of a mesh shape or its transform
+def get_mesh_dag_path(mesh):
+	sel = om.MSelectionList()
+	sel.add(mesh)
+	dag_path = sel.getDagPath(0)
+	dag_path.extendToShape()
+	return dag_path
+
+def read_mesh(mesh):
+	return read_geometry(get_mesh_dag_path(mesh))
+
+def read_geometry(dag_path):
+	fn = om.MFnMesh(dag_path)
+	counts, connects = fn.getVertices()
+	return MeshGeometry([(p.x, p.y, p.z) for p in fn.getPoints(om.MSpace.kWorld)], counts, connects)
+
+# the geometry of this many meshes (the most recently aligned to) is kept between alignments
+GEOMETRY_CACHE_SIZE = 8
+
+# LRU cache of MeshGeometry per mesh shape (by full path, so instances are separate).  Callbacks on each cached
+# shape and its world matrix mark its entry stale when the mesh is edited, deformed, or moved, so it's re-read
+# next time; entries dropped from the cache and a new or opened scene remove the callbacks.
+class GeometryCache(object):
+	def __init__(self, size=GEOMETRY_CACHE_SIZE):
+		self.size = size
+		# full path => [MeshGeometry or None if stale, MObjectHandle of the shape, callback ids]
+		self.entries = OrderedDict()
+		self.scene_callback_ids = []
+
+	def get(self, mesh):
+		dag_path = get_mesh_dag_path(mesh)
+		key = dag_path.fullPathName()
+		entry = self.entries.pop(key, None)
+		if None != entry and not entry[1].isValid():
+			self._remove_callbacks(entry)
+			entry = None
+		if None == entry:
+			while len(self.entries) >= self.size:
+				self._remove_callbacks(self.entries.popitem(last=False)[1])
+			entry = [None, om.MObjectHandle(dag_path.node()), self._add_callbacks(key, dag_path)]
+		if None == entry[0]:
+			entry[0] = read_geometry(dag_path)
+		self.entries[key] = entry # most recently used last
+		return entry[0]
+
+	def clear(self):
+		for entry in self.entries.values():
+			self._remove_callbacks(entry)
+		self.entries = OrderedDict()
+
+	def _add_callbacks(self, key, dag_path):
+		if not len(self.scene_callback_ids):
+			self.scene_callback_ids = [
+				om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeNew, self._on_scene_changed),
+				om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeOpen, self._on_scene_changed)
+			]
+		return [
+			om.MNodeMessage.addNodeDirtyCallback(dag_path.node(), self._on_dirty, key),
+			om.MDagMessage.addWorldMatrixModifiedCallback(dag_path, self._on_world_matrix_modified, key)
+		]
+
+	def _remove_callbacks(self, entry):
+		try:
+			om.MMessage.removeCallbacks(entry[2])
+		except RuntimeError:
+			pass # deleted nodes take their callbacks with them
+
+	def _on_dirty(self, node, key):
+		entry = self.entries.get(key)
+		if None != entry:
+			entry[0] = None
+
+	def _on_world_matrix_modified(self, transform, modified, key):
+		self._on_dirty(transform, key)
+
+	def _on_scene_changed(self, client_data):
+		self.clear()
+
+g_geometry_cache = GeometryCache()
+
+# ways of combining the selected faces into one position and direction
+MODE_AVERAGE = 'average' # mean of the face centers and of the face normals, every face counting the same
+MODE_AREA = 'area' # area-weighted, so many small faces don't outweigh a few big ones
+MODE_PLANE = 'plane' # plane best fitting the selected vertices (PCA), facing the same way as the faces
+MODE_CLUSTER = 'cluster' # the largest (by area) group of faces facing roughly the same way
+ALIGN_MODES = [MODE_AVERAGE, MODE_AREA, MODE_PLANE, MODE_CLUSTER]
+
+# faces within this angle of the dominant direction belong to its cluster
+CLUSTER_ANGLE = 30.0
+# normals are binned on a grid this fine (per unit) to find the dominant direction
+CLUSTER_BINS = 4
+# the plane mode falls back to the area-weighted normal when the vertices' two least spreads are this close
+# (relative to the largest), e.g. all in a line, as then no single direction is the plane's normal
+PLANE_TOLERANCE = 1e-9
+
+# Slots into connects of the faces' vertices, face after face, their faces' vertex counts, and where each
+# face starts among them.
+def face_slots_numpy(geometry, faces):
+	counts = geometry.counts[faces]
+	face_starts = np.cumsum(counts) - counts
+	local = np.arange(counts.sum()) - np.repeat(face_starts, counts)
+	return (np.repeat(geometry.offsets[faces], counts) + local, counts, face_starts)
+
+# Centroid (average of its points), unit normal, and area of each of the given faces, and the points of
+# all of their vertices, as (centroids, normals, areas, vertex_points).  Normals use Newell's method
+# (sum of the cross products of consecutive points), which also handles non-planar n-gons and gives
+# twice the area as its length; degenerate faces get a zero normal.
+def face_data(geometry, faces):
+	centroids, normals, areas = geometry.face_frames(faces)
+	return (centroids, normals, areas, geometry.vertex_points(faces))
+
+def face_frames_numpy(geometry, faces):
+	slots, counts, face_starts = face_slots_numpy(geometry, np.asarray(faces, dtype=np.intp))
+	# each vertex's next one around its face
+	next_slots = slots + 1
+	last = face_starts + counts - 1
+	next_slots[last] = slots[face_starts]
+	points = geometry.points[geometry.connects[slots]]
+	next_points = geometry.points[geometry.connects[next_slots]]
+
+	centroids = np.add.reduceat(points, face_starts) / counts[:, None]
+	normals = np.add.reduceat(np.cross(points, next_points), face_starts)
+	lengths = np.sqrt((normals * normals).sum(axis=1))
+	normals /= np.where(lengths > 0.0, lengths, 1.0)[:, None]
+	return (centroids, normals, lengths * 0.5)
+
+def face_frames_python(geometry, faces):
+	centroids = []
+	normals = []
+	areas = []
+	for face in faces:
+		start = geometry.offsets[face]
+		count = geometry.counts[face]
+		points = [geometry.points[x] for x in geometry.connects[start:start+count]]
+		centroids.append(tuple(sum(p[axis] for p in points) / count for axis in range(3)))
+		nx = ny = nz = 0.0
+		for idx, p in enumerate(points):
+			q = points[(idx + 1) % count]
+			nx += p[1] * q[2] - p[2] * q[1]
+			ny += p[2] * q[0] - p[0] * q[2]
+			nz += p[0] * q[1] - p[1] * q[0]
+		length = (nx * nx + ny * ny + nz * nz) ** 0.5
+		normals.append((nx / (length or 1.0), ny / (length or 1.0), nz / (length or 1.0)))
+		areas.append(length * 0.5)
+	return (centroids, normals, areas)
+
+def normalized(vector):
+	length = sum(x * x for x in vector) ** 0.5
+	if 0.0 == length:
+		return list(vector)
+	return [x / length for x in vector]
+
+def dot(a, b):
+	return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+def cross(a, b):
+	return [a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]]
+
+# eigenvalues of a symmetric 3x3 matrix in ascending order, in closed form (trigonometric solution of the cubic)
+def symmetric_eigenvalues(m):
+	off_diagonal = m[0][1] ** 2 + m[0][2] ** 2 + m[1][2] ** 2
+	if 0.0 == off_diagonal:
+		return sorted([m[0][0], m[1][1], m[2][2]])
+	q = (m[0][0] + m[1][1] + m[2][2]) / 3.0
+	p = ((sum((m[x][x] - q) ** 2 for x in range(3)) + 2.0 * off_diagonal) / 6.0) ** 0.5
+	b = [[(m[r][c] - (q if r == c else 0.0)) / p for c in range(3)] for r in range(3)]
+	half_det = dot(b[0], cross(b[1], b[2])) * 0.5
+	phi = math.acos(max(-1.0, min(1.0, half_det))) / 3.0
+	largest = q + 2.0 * p * math.cos(phi)
+	smallest = q + 2.0 * p * math.cos(phi + 2.0 * math.pi / 3.0)
+	return [smallest, 3.0 * q - largest - smallest, largest]
+
+# the vertices only decide a plane if they spread least in a single direction
+def is_plane_defined(eigenvalues):
+	return eigenvalues[1] - eigenvalues[0] > PLANE_TOLERANCE * eigenvalues[2]
+
+# (center, normal) of the faces' data combined as mode says
+def aggregate(centroids, normals, areas, vertex_points, mode=MODE_AVERAGE):
+	if mode not in ALIGN_MODES:
+		raise ValueError('Unknown alignment mode: %s' % mode)
+	if None != np:
+		return aggregate_numpy(np.asarray(centroids, dtype=np.float64).reshape(-1, 3), np.asarray(normals, dtype=np.float64).reshape(-1, 3), np.asarray(areas, dtype=np.float64), np.asarray(vertex_points, dtype=np.float64).reshape(-1, 3), mode)
+	return aggregate_python(centroids, normals, areas, vertex_points, mode)
+
+def aggregate_numpy(centroids, normals, areas, vertex_points, mode):
+	if MODE_AVERAGE == mode:
+		return (centroids.mean(axis=0).tolist(), normalized(normals.sum(axis=0).tolist()))
+
+	total_area = areas.sum() or 1.0
+	area_center = ((centroids * areas[:, None]).sum(axis=0) / total_area).tolist()
+	area_normal = normalized((normals * areas[:, None]).sum(axis=0).tolist())
+	if MODE_AREA == mode:
+		return (area_center, area_normal)
+
+	if MODE_PLANE == mode:
+		center = vertex_points.mean(axis=0)
+		offsets = vertex_points - center
+		# the direction the vertices spread least in is the plane's normal
+		values, vectors = np.linalg.eigh(np.dot(offsets.T, offsets))
+		if not is_plane_defined(values):
+			return (center.tolist(), area_normal)
+		normal = vectors[:, 0].tolist()
+		if dot(normal, area_normal) < 0.0:
+			normal = [-x for x in normal]
+		return (center.tolist(), normalized(normal))
+
+	# heaviest bin of similar normals, then every face within CLUSTER_ANGLE of it, refined once
+	# each bin's three grid coordinates packed into one integer, as unique is much faster on those than on rows
+	cells = np.round(normals * CLUSTER_BINS).astype(np.int64) + CLUSTER_BINS
+	inverse = np.unique(np.dot(cells, [1, 2 * CLUSTER_BINS + 1, (2 * CLUSTER_BINS + 1) ** 2]), return_inverse=True)[1].reshape(-1)
+	direction = normals[inverse == np.argmax(np.bincount(inverse, weights=areas))]
+	direction = normalized(direction.sum(axis=0).tolist())
+	threshold = np.cos(np.radians(CLUSTER_ANGLE))
+	for _ in range(2):
+		members = np.dot(normals, direction) >= threshold
+		direction = normalized((normals[members] * areas[members, None]).sum(axis=0).tolist())
+	member_area = areas[members].sum() or 1.0
+	center = ((centroids[members] * areas[members, None]).sum(axis=0) / member_area).tolist()
+	return (center, direction)
+
+def aggregate_python(centroids, normals, areas, vertex_points, mode):
+	def weighted_sum(vectors, weights):
+		return [sum(v[axis] * w for v, w in zip(vectors, weights)) for axis in range(3)]
+
+	if MODE_AVERAGE == mode:
+		count = len(centroids)
+		return ([x / count for x in weighted_sum(centroids, [1.0] * count)], normalized(weighted_sum(normals, [1.0] * count)))
+
+	total_area = sum(areas) or 1.0
+	area_center = [x / total_area for x in weighted_sum(centroids, areas)]
+	area_normal = normalized(weighted_sum(normals, areas))
+	if MODE_AREA == mode:
+		return (area_center, area_normal)
+
+	if MODE_PLANE == mode:
+		count = len(vertex_points)
+		center = [sum(p[axis] for p in vertex_points) / count for axis in range(3)]
+		offsets = [[p[axis] - center[axis] for axis in range(3)] for p in vertex_points]
+		covariance = [[sum(o[r] * o[c] for o in offsets) for c in range(3)] for r in range(3)]
+		values = symmetric_eigenvalues(covariance)
+		if not is_plane_defined(values):
+			return (center, area_normal)
+		# the smallest eigenvalue's eigenvector is perpendicular to every row of covariance - smallest*I,
+		# so it is their largest cross product (the rows span a plane as the eigenvalue isn't repeated)
+		rows = [[covariance[r][c] - (values[0] if r == c else 0.0) for c in range(3)] for r in range(3)]
+		normal = max([cross(rows[0], rows[1]), cross(rows[0], rows[2]), cross(rows[1], rows[2])], key=lambda x: dot(x, x))
+		if dot(normal, area_normal) < 0.0:
+			normal = [-x for x in normal]
+		return (center, normalized(normal))
+
+	# heaviest bin of similar normals, then every face within CLUSTER_ANGLE of it, refined once
+	bins = {}
+	for normal, area in zip(normals, areas):
+		key = tuple(int(round(x * CLUSTER_BINS)) for x in normal)
+		entry = bins.setdefault(key, [0.0, [0.0, 0.0, 0.0]])
+		entry[0] += area
+		entry[1] = [a + b for a, b in zip(entry[1], normal)]
+	direction = normalized(max(bins.values(), key=lambda x: x[0])[1])
+	threshold = math.cos(math.radians(CLUSTER_ANGLE))
+	for _ in range(2):
+		members = [idx for idx, normal in enumerate(normals) if dot(normal, direction) >= threshold]
+		direction = normalized(weighted_sum([normals[x] for x in members], [areas[x] for x in members]))
+	member_area = sum(areas[x] for x in members) or 1.0
+	center = [x / member_area for x in weighted_sum([centroids[x] for x in members], [areas[x] for x in members])]
+	return (center, direction)
+
+# node.f[index], node.f[first:last], or node.f[*], as ls lists selected faces
+FACE_COMPONENT_RE = re.compile(r'^(.+)\.f\[(\*|\d+)(?::(\d+))?\]$')
+
+def count_faces(mesh):
+	return cmds.polyEvaluate(mesh, face=True)
+
+# Mesh name => face indices (an array with numpy, otherwise a list) from component strings such as
+# 'pCube1.f[0:99999]', without expanding ranges one face at a time in python.  Other components and
+# whole objects are skipped.  f[*] asks face_count(mesh) how many faces the mesh has.
+def parse_face_components(components, face_count=count_faces):
+	ranges = OrderedDict() # mesh => [(first, count)]
+	for component in components:
+		match = FACE_COMPONENT_RE.match(component)
+		if None == match:
+			continue
+		mesh, first, last = match.groups()
+		if '*' == first:
+			first, count = 0, face_count(mesh)
+		else:
+			first = int(first)
+			count = (int(last) if None != last else first) - first + 1
+		ranges.setdefault(mesh, []).append((first, count))
+	return OrderedDict((mesh, expand_ranges(x)) for mesh, x in ranges.items())
+
+# indices covered by (first, count) ranges, in order
+def expand_ranges(ranges):
+	if None != np:
+		firsts, counts = np.array(ranges, dtype=np.intp).reshape(-1, 2).T
+		# arange over all of them, shifted so each range starts at its first index
+		return np.arange(counts.sum(), dtype=np.intp) + np.repeat(firsts - (np.cumsum(counts) - counts), counts)
+	indices = []
+	for first, count in ranges:
+		indices.extend(range(first, first + count))
+	return indices
+
+# mesh name => face indices of the selected faces
+def get_selected_face_indices():
+	return parse_face_components(cmds.ls(sl=True) or [])
+
+# (center, normal) of the faces, given as {mesh: [face indices]}, combined as mode says.
+# Meshes come from the geometry cache unless another cache (or None, to always read) is given.
+def get_center_and_normal(faces_by_mesh, mode=MODE_AVERAGE, cache=g_geometry_cache):
+	data = [[], [], [], []]
+	for mesh, faces in faces_by_mesh.items():
+		geometry = read_mesh(mesh) if None == cache else cache.get(mesh)
+		for column, values in zip(data, face_data(geometry, faces)):
+			column.append(values)
+	if None != np:
+		data = [np.concatenate(x) for x in data]
+	else:
+		data = [[v for values in x for v in values] for x in data]
+	return aggregate(data[0], data[1], data[2], data[3], mode)
+
+# (transform, shape) of the camera looking through the focused viewport
+def get_active_camera():
+	active_panel = cmds.getPanel(wf=True)
 	if 'scriptEditorPanel1' == active_panel:
 		cmds.error("Please don't call me from the script editor!")
-	active_camera_xform = pm.modelEditor(active_panel, camera=True, q=True)
-	if None == active_camera_xform:
+	if 'modelPanel' != cmds.getPanel(typeOf=active_panel):
+		cmds.error("Please focus a viewport first.")
+	active_camera = cmds.modelEditor(active_panel, camera=True, q=True)
+	if None == active_camera:
 		cmds.error("Failed to find active panel's camera.")
-	active_camera = pm.listRelatives(active_camera_xform)[0]
+	# the editor can report either the camera's transform or its shape
+	if 'camera' == cmds.nodeType(active_camera):
+		return (cmds.listRelatives(active_camera, parent=True, fullPath=True)[0], active_camera)
+	return (active_camera, cmds.listRelatives(active_camera, shapes=True, fullPath=True)[0])
+
+def look_at_selected_faces(mode=MODE_AVERAGE):
+	# get the active camera
+	active_camera_xform, active_camera = get_active_camera()
 
-	# get all selected faces
-	selected_faces = filter(lambda x: isinstance(x, pm.MeshFace), pm.selected())
-	selected_faces = [x for sublist in selected_faces for x in sublist]
-	if not len(selected_faces):
+	# get all selected faces, as indices per mesh
+	selected_faces = get_selected_face_indices()
+	if not sum(len(x) for x in selected_faces.values()):
 		cmds.error("Please select at least one face.")
 
-	# compute average normal
-	average_normal = __get_average_normal(selected_faces)
-	# compute average position
-	average_position = __get_average_center(selected_faces)
+	# compute average position and normal, reading each mesh once
+	average_position, average_normal = get_center_and_normal(selected_faces, mode)
+	if not any(average_normal):
+		cmds.error("The selected faces' normals cancel out; try the '%s' or '%s' mode." % (MODE_PLANE, MODE_CLUSTER))
+	average_position = om.MVector(average_position)
+	average_normal = om.MVector(average_normal)
 
 	# distance from camera's current position to average position
-	initial_distance = (average_position - active_camera_xform.getTranslation(space='world')).length()
+	initial_distance = (average_position - om.MVector(cmds.xform(active_camera_xform, q=True, ws=True, t=True))).length()
 	# new position from average along normal by the initial camera's distance
 	new_position = (average_position + average_normal * initial_distance)
 	# https://help.autodesk.com/cloudhelp/2016/ENU/Maya-Tech-Docs/CommandsPython/viewPlace.html
-	cmds.viewPlace(str(active_camera), an=True, eye=new_position, la=average_position, up=[0.0, 1.0, 0.0])
+	cmds.viewPlace(active_camera, an=True, eye=list(new_position), la=list(average_position), up=[0.0, 1.0, 0.0])
 
-look_at_selected_faces()
+# running the script (e.g. from a shelf button) aligns straight away; importing it doesn't
+if '__main__' == __name__:
+	look_at_selected_faces()
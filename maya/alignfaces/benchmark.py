@@ -0,0 +1,142 @@
+#
+# Align Faces Benchmarks
+# Daniel Green, 2019
+# GitHub: KasumiL5x
+#
+# Timings for the face centroid/normal computation and selection parsing, which use synthetic data and no scene.
+# bench_import times importing the script in a fresh mayapy, and bench_pymel compares against the original
+# PyMEL path (and a repeat alignment from the geometry cache) on a real plane, so both need Maya.
+# Run from mayapy (so the maya imports resolve): mayapy benchmark.py
+
+import os
+import sys
+import time
+import subprocess
+import random
+from functools import reduce
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(SCRIPT_DIR)
+import align_camera_to_faces as acf
+
+# quads on a size x size grid, with a little noise so normals differ
+def make_grid(size, seed=0):
+	rng = random.Random(seed)
+	points = [(x, y, rng.uniform(-0.1, 0.1)) for y in range(size + 1) for x in range(size + 1)]
+	connects = []
+	for y in range(size):
+		for x in range(size):
+			corner = y * (size + 1) + x
+			connects.extend([corner, corner + 1, corner + size + 2, corner + size + 1])
+	return acf.MeshGeometry(points, [4] * (size * size), connects)
+#end
+
+def time_call(func, *args):
+	start = time.time()
+	func(*args)
+	return time.time() - start
+#end
+
+def bench_geometry(sizes=(100, 300, 1000)):
+	numpy_label = 'numpy (s)' if None != acf.np else 'numpy (n/a)'
+	print('%10s %12s %12s' % ('faces', 'python (s)', numpy_label))
+	for size in sizes:
+		geometry = make_grid(size)
+		faces = list(range(size * size))
+		python = time_call(acf.face_frames_python, geometry, faces)
+		vectorized = '-'
+		if None != acf.np:
+			vectorized = '%.4f' % time_call(acf.face_frames_numpy, geometry, faces)
+		print('%10d %12.4f %12s' % (size * size, python, vectorized))
+#end
+
+# combining the per-face data in each mode, from the arrays the numpy path produces
+def bench_modes(size=300):
+	geometry = make_grid(size)
+	data = acf.face_data(geometry, list(range(size * size)))
+	print('%10s %12s' % ('mode', 'seconds'))
+	for mode in acf.ALIGN_MODES:
+		print('%10s %12.4f' % (mode, time_call(acf.aggregate, data[0], data[1], data[2], data[3], mode)))
+#end
+
+# parsing selected faces as ls lists them: one range covering every face, and every other face (one string each)
+def bench_selection(sizes=(10000, 100000, 1000000)):
+	print('%10s %12s %12s' % ('faces', 'range (s)', 'scattered (s)'))
+	for size in sizes:
+		whole = time_call(acf.parse_face_components, ['pPlane1.f[0:%d]' % (size - 1)])
+		scattered = time_call(acf.parse_face_components, ['pPlane1.f[%d]' % x for x in range(0, size, 2)])
+		print('%10d %12.4f %12.4f' % (size, whole, scattered))
+#end
+
+# Run in a fresh interpreter (with Maya already initialized, as it is in the UI) so nothing is imported yet;
+# prints the seconds the import took and whether it pulled in PyMEL.
+IMPORT_SNIPPET = """
+import sys, time
+import maya.standalone
+maya.standalone.initialize(name='python')
+sys.path.append(%r)
+start = time.time()
+import %s
+print('%%f %%d' %% (time.time() - start, 'pymel.core' in sys.modules))
+"""
+
+def time_import(module):
+	output = subprocess.check_output([sys.executable, '-c', IMPORT_SNIPPET % (SCRIPT_DIR, module)])
+	seconds, pymel = output.decode().strip().splitlines()[-1].split()
+	return (float(seconds), '1' == pymel)
+#end
+
+# importing the script against importing PyMEL, which the script used to do every time it ran
+def bench_import():
+	print('%22s %12s %12s' % ('module', 'import (s)', 'pymel loaded'))
+	for module in ['align_camera_to_faces', 'pymel.core']:
+		seconds, pymel = time_import(module)
+		print('%22s %12.4f %12s' % (module, seconds, pymel))
+#end
+
+# the original __get_average_center/__get_average_normal over flattened pm.MeshFace objects
+def pymel_average(faces):
+	import pymel.core as pm
+	center = pm.datatypes.Vector()
+	normal = pm.datatypes.Vector()
+	for curr_face in faces:
+		points = curr_face.getPoints(space='world')
+		center += reduce(lambda x, y: x+y, points) / len(points)
+		normal += curr_face.getNormal(space='world')
+	return (center / len(faces), normal.normal())
+#end
+
+def bench_pymel(sizes=(30, 100, 300)):
+	import maya.standalone
+	maya.standalone.initialize(name='python')
+	import maya.cmds as cmds
+	import pymel.core as pm
+
+	print('%10s %12s %12s %12s' % ('faces', 'pymel (s)', 'new (s)', 'cached (s)'))
+	for size in sizes:
+		cmds.file(new=True, force=True)
+		plane = cmds.polyPlane(sx=size, sy=size)[0]
+		cmds.select(plane + '.f[*]')
+		start = time.time()
+		selected_faces = filter(lambda x: isinstance(x, pm.MeshFace), pm.selected())
+		pymel_average([x for sublist in selected_faces for x in sublist])
+		pymel = time.time() - start
+		start = time.time()
+		acf.get_center_and_normal(acf.get_selected_face_indices(), cache=None)
+		new = time.time() - start
+		# aligning again to the unchanged mesh, as when hitting the shelf button repeatedly
+		acf.get_center_and_normal(acf.get_selected_face_indices())
+		start = time.time()
+		acf.get_center_and_normal(acf.get_selected_face_indices())
+		print('%10d %12.4f %12.4f %12.4f' % (size * size, pymel, new, time.time() - start))
+#end
+
+if __name__ == '__main__':
+	bench_import()
+	print('')
+	bench_geometry()
+	print('')
+	bench_modes()
+	print('')
+	bench_selection()
+	print('')
+	bench_pymel()
@@ -0,0 +1,128 @@
+#
+# Maximum Replacer Benchmarks
+# Daniel Green, 2019
+# GitHub: KasumiL5x
+#
+# Synthetic timings for the selection and substitution pipelines; no scene is touched.
+# Run from mayapy (so the maya imports resolve): mayapy benchmark.py
+
+import os
+import re
+import sys
+import time
+import random
+import multiprocessing
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sceneindex'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'stageprofiler'))
+import sceneindex
+import replacercore
+
+NODE_TYPES = ['transform', 'mesh', 'joint', 'nurbsCurve', 'shadingEngine', 'lambert', 'animCurveTL', 'locator']
+SIDES = ['L', 'R', 'C']
+PARTS = ['arm', 'leg', 'spine', 'neck', 'finger', 'toe', 'prop', 'geo']
+
+def make_snapshot(count, seed=0):
+	rng = random.Random(seed)
+	long_names = []
+	types = []
+	for idx in range(count):
+		name = '%s_%s_%s_%06d' % (rng.choice(SIDES), rng.choice(PARTS), rng.choice(['ctrl', 'jnt', 'grp', 'geo']), idx)
+		long_names.append('|root|' + name)
+		types.append(rng.choice(NODE_TYPES))
+	return sceneindex.SceneSnapshot(long_names, types)
+#end
+
+# the original get_selection filtering, which builds to_remove lists and tests membership per element
+def legacy_filter(snapshot, name_pattern, type_pattern):
+	result = list(zip(snapshot.short_names, snapshot.long_names, snapshot.types))
+	for pattern, column in [(type_pattern, 2), (name_pattern, 0)]:
+		to_remove = []
+		for idx in range(len(result)):
+			if None == re.search(pattern, result[idx][column]):
+				to_remove.append(idx)
+		result = [x for idx, x in enumerate(result) if idx not in to_remove]
+	return result
+#end
+
+def pipeline_filter(snapshot, name_pattern, type_pattern):
+	return list(sceneindex.iter_filtered(snapshot, name_pattern, type_pattern))
+#end
+
+def time_call(func, *args):
+	start = time.time()
+	count = len(func(*args))
+	return time.time() - start, count
+#end
+
+# legacy_max caps the quadratic version, which takes hours well before 1M names
+def bench_filter(sizes=(1000, 10000, 100000, 1000000), legacy_max=10000):
+	name_pattern = r'^L_arm_ctrl' # rejects the vast majority of nodes
+	type_pattern = r'transform|joint'
+	print('%10s %12s %12s %10s' % ('names', 'legacy (s)', 'pipeline (s)', 'matches'))
+	for size in sizes:
+		snapshot = make_snapshot(size)
+		legacy = '-'
+		if size <= legacy_max:
+			legacy = '%.4f' % time_call(legacy_filter, snapshot, name_pattern, type_pattern)[0]
+		elapsed, count = time_call(pipeline_filter, snapshot, name_pattern, type_pattern)
+		print('%10d %12s %12.4f %10d' % (size, legacy, elapsed, count))
+#end
+
+# the per-node type test iter_filtered used before the snapshot had type buckets
+def scan_type_filter(snapshot, type_pattern):
+	type_re = re.compile(type_pattern)
+	matching_types = set(x for x in set(snapshot.types) if None != type_re.search(x))
+	types = snapshot.types
+	return [idx for idx in range(len(snapshot)) if types[idx] in matching_types]
+#end
+
+def bucket_type_filter(snapshot, type_pattern):
+	return list(sceneindex.iter_filtered(snapshot, '', type_pattern))
+#end
+
+def bench_type_filter(sizes=(10000, 100000, 1000000)):
+	print('%10s %10s %12s %12s %12s %10s' % ('names', 'type', 'scan (s)', 'first (s)', 'cached (s)', 'matches'))
+	for size in sizes:
+		for type_pattern in ['joint', 'transform|joint']:
+			snapshot = make_snapshot(size)
+			scan = time_call(scan_type_filter, snapshot, type_pattern)[0]
+			first = time_call(bucket_type_filter, snapshot, type_pattern)[0] # includes building the buckets
+			cached, count = time_call(bucket_type_filter, snapshot, type_pattern)
+			print('%10d %10s %12.4f %12.4f %12.4f %10d' % (size, type_pattern, scan, first, cached, count))
+#end
+
+# the original calculate_regexed_names loop (with the Python formValidObjectName)
+def legacy_substitute(names, pattern, subs):
+	result = []
+	for name in names:
+		subbed_name = name
+		try:
+			subbed_name = re.sub(pattern, subs, name)
+			subbed_name = replacercore.form_valid_object_name(subbed_name)
+			result.append((subbed_name, subbed_name != name))
+		except:
+			result.append((subbed_name, False))
+	return result
+#end
+ 
+def column_substitute(names, pattern, subs, processes=0):
+	return replacercore.substitute_column(names, [(pattern, subs)], processes=processes)[0]
+#end
+ 
+def bench_substitute(sizes=(1000, 10000, 100000, 1000000), processes=None):
+	processes = processes or multiprocessing.cpu_count()
+	pattern = r'^([LR])_(\w+?)_ctrl'
+	subs = r'\2_\1_CTRL'
+	print('%10s %12s %12s %12s' % ('names', 'loop (s)', 'column (s)', 'pool x%d (s)' % processes))
+	for size in sizes:
+		names = make_snapshot(size).short_names
+		loop = time_call(legacy_substitute, names, pattern, subs)[0]
+		column = time_call(column_substitute, names, pattern, subs)[0]
+		pool = time_call(column_substitute, names, pattern, subs, processes)[0]
+		print('%10d %12.4f %12.4f %12.4f' % (size, loop, column, pool))
+#end
+ 
+if __name__ == '__main__':
+	bench_filter()
+	bench_type_filter()
+	bench_substitute()
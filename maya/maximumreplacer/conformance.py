@@ -0,0 +1,83 @@
+#
+# Maximum Replacer Name Conformance
+# Daniel Green, 2019
+# GitHub: KasumiL5x
+#
+# Checks replacercore.form_valid_object_name, which decides the names nodes are renamed to, against MEL's
+# formValidObjectName: every case below is compared with the table and with MEL itself.
+# Run from mayapy: mayapy conformance.py
+# After a Maya upgrade, mayapy conformance.py --record prints MEL's outputs in the table's format.
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sceneindex'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'stageprofiler'))
+
+# (name, formValidObjectName(name)) covering plain names, empty names, leading digits, namespaces and
+# paths, punctuation (including quotes, which used to break the MEL call), whitespace, and non-ASCII.
+# Invalid characters become underscores first, so only a leading digit adds one more.  Any entry MEL
+# disagrees with is reported; replace the table with the output of --record from the Maya version in use.
+FORM_VALID_OBJECT_NAME_CASES = [
+	(u'pCube1', u'pCube1'),
+	(u'L_arm_CTRL', u'L_arm_CTRL'),
+	(u'_hidden', u'_hidden'),
+	(u'', u'defaultObject'),
+	(u'1abc', u'_1abc'),
+	(u'123', u'_123'),
+	(u'0', u'_0'),
+	(u'ns:pCube1', u'ns_pCube1'),
+	(u':pCube1', u'_pCube1'),
+	(u'a|b', u'a_b'),
+	(u'arm.ctrl', u'arm_ctrl'),
+	(u'x-y-z', u'x_y_z'),
+	(u'-abc', u'_abc'),
+	(u'pCube#', u'pCube_'),
+	(u"it's", u'it_s'),
+	(u'quote"d', u'quote_d'),
+	(u'back\\slash', u'back_slash'),
+	(u'a b', u'a_b'),
+	(u' lead', u'_lead'),
+	(u'trail ', u'trail_'),
+	(u'tab\tname', u'tab_name'),
+	(u'caf\xe9', u'caf_'),
+	(u'\xe9t\xe9', u'_t_'),
+	(u'\u65e5\u672c', u'__')
+]
+
+def mel_form_valid_object_name(name):
+	import maya.mel as mel
+	# escaped so that quotes and backslashes reach MEL as part of the name
+	escaped = name.replace('\\', '\\\\').replace('"', '\\"').replace('\t', '\\t')
+	return mel.eval(u'formValidObjectName("%s");' % escaped)
+#end
+
+# [(name, source, expected, actual), ...] for every case where form_valid_object_name disagrees with the table or MEL
+def find_mismatches(cases):
+	import replacercore
+	mismatches = []
+	for name, expected in cases:
+		actual = replacercore.form_valid_object_name(name)
+		for source, value in [('table', expected), ('mel', mel_form_valid_object_name(name))]:
+			if value != actual:
+				mismatches.append((name, source, value, actual))
+	return mismatches
+#end
+
+def main(argv):
+	import maya.standalone
+	maya.standalone.initialize(name='python')
+
+	if '--record' in argv:
+		for name, expected in FORM_VALID_OBJECT_NAME_CASES:
+			print('\t(%r, %r),' % (name, mel_form_valid_object_name(name)))
+		return 0
+
+	mismatches = find_mismatches(FORM_VALID_OBJECT_NAME_CASES)
+	for name, source, expected, actual in mismatches:
+		print('%r: %s gives %r, form_valid_object_name gives %r' % (name, source, expected, actual))
+	print('%d cases, %d mismatches' % (len(FORM_VALID_OBJECT_NAME_CASES), len(mismatches)))
+	return 1 if len(mismatches) else 0
+#end
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
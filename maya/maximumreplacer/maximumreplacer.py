@@ -3,14 +3,16 @@
 # Daniel Green, 2019
 # GitHub: KasumiL5x
 
-import re
+import threading
 import PySide2.QtCore as QC
 import PySide2.QtGui as QG
 import PySide2.QtWidgets as QW
 import shiboken2
 import maya.cmds as mc
-import maya.mel as mel
 import maya.OpenMayaUI as omui
+import sceneindex
+import stageprofiler
+import replacercore
  
 def get_maya_window():
 	ptr = omui.MQtUtil.mainWindow()
@@ -18,15 +20,106 @@ def get_maya_window():
 	return parent
 #end
  
+# milliseconds of typing inactivity before a preview is computed
+UPDATE_DELAY_MS = 200
+ 
+class PreviewSignals(QC.QObject):
+	# (job id, (selected_items, regexed_items))
+	finished = QC.Signal(int, object)
+#end
+ 
+# Computes a preview off the UI thread.  A thread rather than a process, as the work is
+# pure-Python on an in-memory snapshot and Maya doesn't take kindly to forking itself.
+class PreviewJob(threading.Thread):
+	def __init__(self, job_id, signals, snapshot, filter_name, filter_type, steps):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.job_id = job_id
+		self.signals = signals
+		self.args = (snapshot, filter_name, filter_type, steps)
+		self.cancelled = threading.Event()
+	#end
+ 
+	def cancel(self):
+		self.cancelled.set()
+	#end
+ 
+	def run(self):
+		result = replacercore.compute_preview(*self.args, cancelled=self.cancelled)
+		if None != result and not self.cancelled.is_set():
+			self.signals.finished.emit(self.job_id, result)
+	#end
+#end
+ 
+# Read-only view over the selected/regexed lists.  Rows are only formatted when Qt asks for
+# them (i.e. when visible), so a refresh is one model reset regardless of the row count.
+class PreviewModel(QC.QAbstractListModel):
+	def __init__(self, parent=None):
+		QC.QAbstractListModel.__init__(self, parent)
+		self.selected_items = []
+		self.regexed_items = []
+		self.bold_font = QG.QFont('', -1, QG.QFont.Bold, False)
+	#end
+ 
+	def set_items(self, selected_items, regexed_items):
+		self.beginResetModel()
+		self.selected_items = selected_items
+		self.regexed_items = regexed_items
+		self.endResetModel()
+	#end
+ 
+	def rowCount(self, parent=QC.QModelIndex()):
+		if parent.isValid():
+			return 0
+		return len(self.selected_items)
+	#end
+ 
+	def data(self, index, role=QC.Qt.DisplayRole):
+		if not index.isValid():
+			return None
+ 
+		short_new, changed = self.regexed_items[index.row()]
+		if QC.Qt.DisplayRole == role:
+			short_old = self.selected_items[index.row()][0]
+			return (short_old + ' => ' + short_new) if changed else short_old
+		if QC.Qt.FontRole == role and changed:
+			return self.bold_font
+		return None
+	#end
+#end
+ 
 class MaximumReplacer(QW.QDialog):
-	def __init__(self, parent=get_maya_window()):
+	def __init__(self, parent=None):
+		# resolved here rather than as a default argument so the module imports without a UI (e.g. mayapy)
+		if None == parent:
+			parent = get_maya_window()
 		QW.QDialog.__init__(self, parent=parent)
  
+		# shared cache of the scene's nodes, kept current by callbacks
+		self.scene_index = sceneindex.acquire()
+ 
 		# [(short_name, long_name), ...]
 		self.selected_items = []
 		# [(regexed_short_name, different_from_original), ...] maps 1-1 with the above in size
 		self.regexed_items = []
  
+		# saved chains of pattern => substitution steps
+		self.preset_store = replacercore.PresetStore()
+ 
+		# debounced background previews; only the most recent job's result is ever shown
+		self.preview_job = None
+		self.preview_job_id = 0
+		self.preview_signals = PreviewSignals()
+		self.preview_signals.finished.connect(self.on_preview_ready)
+		self.preview_timer = QC.QTimer(self)
+		self.preview_timer.setSingleShot(True)
+		self.preview_timer.setInterval(UPDATE_DELAY_MS)
+		self.preview_timer.timeout.connect(self.start_preview_job)
+ 
+		# the close button, Esc, and reject() all end in done(), which emits finished (closeEvent misses Esc)
+		self.released = False
+		self.finished.connect(self.on_finished)
+ 
 		self.setWindowFlags(QC.Qt.Window)
 		self.setWindowTitle('Maximum Replacer')
 		self.setMinimumWidth(380)
@@ -72,6 +165,29 @@ class MaximumReplacer(QW.QDialog):
 		gb_expression.setTitle('Regular Expression')
 		self.layout().addWidget(gb_expression)
 		#
+		preset_widget = QW.QWidget()
+		preset_widget.setLayout(QW.QHBoxLayout())
+		preset_widget.layout().setContentsMargins(2,2,2,2)
+		preset_widget.layout().setSpacing(5)
+		gb_expression.layout().addWidget(preset_widget)
+		#
+		lbl_preset = QW.QLabel()
+		lbl_preset.setText('Preset')
+		preset_widget.layout().addWidget(lbl_preset)
+		#
+		self.cb_preset = QW.QComboBox()
+		self.cb_preset.setToolTip('Steps of the chosen preset run before the pattern below')
+		preset_widget.layout().addWidget(self.cb_preset, 1)
+		#
+		self.btn_preset_save = QW.QPushButton()
+		self.btn_preset_save.setText('Save')
+		self.btn_preset_save.setToolTip('Save the preset\'s steps plus the pattern below as a new preset')
+		preset_widget.layout().addWidget(self.btn_preset_save)
+		#
+		self.btn_preset_delete = QW.QPushButton()
+		self.btn_preset_delete.setText('Delete')
+		preset_widget.layout().addWidget(self.btn_preset_delete)
+		#
 		expr_widget = QW.QWidget()
 		expr_widget.setLayout(QW.QHBoxLayout())
 		expr_widget.layout().setContentsMargins(2,2,2,2)
@@ -109,13 +225,26 @@ class MaximumReplacer(QW.QDialog):
 		gb_preview.setTitle('Preview')
 		self.layout().addWidget(gb_preview)
 		#
-		self.lv_preview = QW.QListWidget()
+		self.preview_model = PreviewModel(self)
+		self.lv_preview = QW.QListView()
+		self.lv_preview.setUniformItemSizes(True) # lets the view skip measuring every row
+		self.lv_preview.setModel(self.preview_model)
 		gb_preview.layout().addWidget(self.lv_preview)
  
-		# Button!
+		# Buttons!
+		buttons_widget = QW.QWidget()
+		buttons_widget.setLayout(QW.QHBoxLayout())
+		buttons_widget.layout().setContentsMargins(0,0,0,0)
+		buttons_widget.layout().setSpacing(5)
+		self.layout().addWidget(buttons_widget)
+		#
+		self.btn_dry_run = QW.QPushButton()
+		self.btn_dry_run.setText('Dry Run')
+		buttons_widget.layout().addWidget(self.btn_dry_run)
+		#
 		self.btn_commit = QW.QPushButton()
 		self.btn_commit.setText('Commit')
-		self.layout().addWidget(self.btn_commit)
+		buttons_widget.layout().addWidget(self.btn_commit, 1)
  
 		# footer
 		footer_widget = QW.QWidget()
@@ -148,9 +277,14 @@ class MaximumReplacer(QW.QDialog):
 		self.txt_replace_subs.editingFinished.connect(self.on_text_edited)
 		self.rb_select_all.clicked.connect(self.update)
 		self.rb_select_sel.clicked.connect(self.update)
+		self.cb_preset.currentIndexChanged.connect(self.update)
+		self.btn_preset_save.clicked.connect(self.save_preset)
+		self.btn_preset_delete.clicked.connect(self.delete_preset)
+		self.btn_dry_run.clicked.connect(self.dry_run)
 		self.btn_commit.clicked.connect(self.commit)
  
 		# initial
+		self.refresh_presets()
 		self.update()
 	#end
  
@@ -159,7 +293,9 @@ class MaximumReplacer(QW.QDialog):
 		if not self.chk_update_while_typing.isChecked():
 			return
  
-		self.update()
+		# restart the countdown so that only a pause in typing computes a preview
+		self.cancel_preview_job()
+		self.preview_timer.start()
 	#end
  
 	# called when changes have been committed in text fields (e.g. return pressed)
@@ -170,82 +306,110 @@ class MaximumReplacer(QW.QDialog):
 		self.update()
 	#end
  
+	def on_finished(self, result):
+		self.preview_timer.stop()
+		self.cancel_preview_job()
+		if not self.released:
+			sceneindex.release()
+			self.released = True
+	#end
+ 
 	def edit_done(self):
 		print 'Editing done'
 	#end
  
-	def get_real_short_names(self, selected):
-		result = []
-		for x in mc.ls(sl=selected, shortNames=True):
-			result.append(x[x.rfind('|')+1:]) # basically strip all after last | (the |+1 becomes 0 if the find fails, so it's okay to fail)
-		return result
+	def get_selection(self, regex=None):
+		# cached names, long names, and types of every node (only changed nodes are re-queried)
+		with stageprofiler.stage('replacer.ls'):
+			snapshot = self.scene_index.snapshot(self.rb_select_sel.isChecked())
+ 
+		# streamed type filter => name filter
+		with stageprofiler.stage('replacer.filter'):
+			indices = sceneindex.iter_filtered(snapshot, self.txt_filter_name.text(), self.txt_filter_type.text())
+			return [(snapshot.short_names[idx], snapshot.long_names[idx]) for idx in indices]
 	#end
  
-	def get_selection(self, regex=None):
-		result = []
- 
-		# all objects
-		if self.rb_select_all.isChecked():
-			result = zip(self.get_real_short_names(False), mc.ls(long=True))
- 
-		# selected objects
-		if self.rb_select_sel.isChecked():
-			result = zip(self.get_real_short_names(True), mc.ls(sl=True, long=True))
- 
-		# filter by type
-		filter_type = self.txt_filter_type.text()
-		if len(filter_type):
-			to_remove = []
-			for idx in range(len(result)):
-				node_type = mc.nodeType(result[idx][1])
-				try:
-					if None == re.search(filter_type, node_type):
-						to_remove.append(idx)
-				except:
-					continue
-			#end for
- 
-			# remove all non-matching elements
-			result = [x for idx, x in enumerate(result) if idx not in to_remove]
-		#end
- 
-		# filter by expression
-		pattern = self.txt_filter_name.text()
-		if len(pattern):
-			to_remove = []
-			for idx in range(len(result)):
-				try:
-					if None == re.search(pattern, result[idx][0]):
-						to_remove.append(idx)
-				except:
-					continue
-			#end for
- 
-			# remove all non-matching elements
-			result = [x for idx, x in enumerate(result) if idx not in to_remove]
-		#end
- 
-		return result
+	# [(pattern, substitution), ...] of the chosen preset followed by what's typed
+	def get_steps(self):
+		steps = []
+		if self.cb_preset.currentIndex() > 0:
+			steps = self.preset_store.get(self.cb_preset.currentText()) or []
+		return steps + [(self.txt_replace_expr.text(), self.txt_replace_subs.text())]
+	#end
+ 
+	def refresh_presets(self, current=None):
+		self.cb_preset.blockSignals(True)
+		self.cb_preset.clear()
+		self.cb_preset.addItem('(none)')
+		self.cb_preset.addItems(self.preset_store.names())
+		self.cb_preset.setCurrentIndex(max(0, self.cb_preset.findText(current)) if None != current else 0)
+		self.cb_preset.blockSignals(False)
+	#end
+ 
+	def save_preset(self):
+		steps = [x for x in self.get_steps() if len(x[0])]
+		if not len(steps):
+			return
+		name, ok = QW.QInputDialog.getText(self, 'Maximum Replacer', 'Preset name:')
+		if not ok or not len(name):
+			return
+ 
+		self.preset_store.set(name, steps)
+		# the typed step now lives in the preset, so clear it to avoid running it twice
+		for txt in [self.txt_replace_expr, self.txt_replace_subs]:
+			txt.blockSignals(True)
+			txt.clear()
+			txt.blockSignals(False)
+		self.refresh_presets(name)
+		self.update()
+	#end
+ 
+	def delete_preset(self):
+		if self.cb_preset.currentIndex() <= 0:
+			return
+		self.preset_store.remove(self.cb_preset.currentText())
+		self.refresh_presets()
+		self.update()
 	#end
  
 	def calculate_regexed_names(self):
-		pattern = self.txt_replace_expr.text()
-		subs = self.txt_replace_subs.text()
-		result = []
- 
-		for x in self.selected_items:
-			subbed_name = x[0]
-			try:
-				subbed_name = re.sub(pattern, subs, x[0])
-				subbed_name = mel.eval('formValidObjectName(\"{0}\");'.format(subbed_name)) # make it maya-valid
-				result.append((subbed_name, subbed_name != x[0])) # (regex name, changed from original)
-			except:
-				result.append((subbed_name, False)) # failed so just pass through data and make it not changed
-			
-		return result
+		new_names, changed = replacercore.substitute_column([x[0] for x in self.selected_items], self.get_steps())
+		return list(zip(new_names, map(bool, changed)))
+	#end
+ 
+	def cancel_preview_job(self):
+		self.preview_timer.stop()
+		if None != self.preview_job:
+			self.preview_job.cancel()
+			self.preview_job = None
+	#end
+ 
+	def start_preview_job(self):
+		self.cancel_preview_job()
+ 
+		# the snapshot must come from the main thread; everything after it is pure python
+		with stageprofiler.stage('replacer.ls'):
+			snapshot = self.scene_index.snapshot(self.rb_select_sel.isChecked())
+		self.preview_job_id += 1
+		self.preview_job = PreviewJob(self.preview_job_id, self.preview_signals, snapshot,
+			self.txt_filter_name.text(), self.txt_filter_type.text(), self.get_steps())
+		self.preview_job.start()
+	#end
+ 
+	def on_preview_ready(self, job_id, result):
+		# superseded by a newer job (or an update) while it was running
+		if job_id != self.preview_job_id or None == self.preview_job:
+			return
+		self.preview_job = None
+ 
+		self.selected_items, self.regexed_items = result
+		self.refresh_preview()
 	#end
  
 	def update(self):
+		# a synchronous update supersedes anything pending
+		self.cancel_preview_job()
+ 
 		# 1. get the selection
 		self.selected_items = self.get_selection()
  
@@ -253,51 +417,51 @@ class MaximumReplacer(QW.QDialog):
 		self.regexed_items = self.calculate_regexed_names()
  
 		# 3. update list view with a preview of changes
-		bold_font = QG.QFont('', -1, QG.QFont.Bold, False)
-		self.lv_preview.clear()
-		for x in range(len(self.selected_items)):
-			short_old = self.selected_items[x][0]
-			short_new = self.regexed_items[x][0]
-			if self.regexed_items[x][1]:
-				txt = short_old + ' => ' + short_new
-			else:
-				txt = short_old
-			self.lv_preview.addItem(txt)
-			if self.regexed_items[x][1]:
-				self.lv_preview.item(self.lv_preview.count()-1).setFont(bold_font)
+		self.refresh_preview()
+	#end
+ 
+	def refresh_preview(self):
+		with stageprofiler.stage('replacer.view'):
+			self.preview_model.set_items(self.selected_items, self.regexed_items)
+	#end
+ 
+	# prints the resolved rename map without changing anything
+	def dry_run(self):
+		if self.preview_timer.isActive() or None != self.preview_job:
+			self.update()
+ 
+		plan = replacercore.plan_renames(self.selected_items, self.regexed_items, self.scene_index.snapshot().long_names)
+		for line in plan.report():
+			print line
+		dialog_msg = '%d objects would be renamed, %d of which to numbered names as theirs are taken.\nSee the Script Editor for the full list.' % (len(plan), len(plan.adjusted()))
+		mc.confirmDialog(title='Maximum Replacer', message=dialog_msg, button=['OK'])
 	#end
  
 	def commit(self):
+		# make sure we commit what's typed, not a preview that's pending or still computing
+		if self.preview_timer.isActive() or None != self.preview_job:
+			self.update()
+ 
 		# safety check
 		if None == self.selected_items or None == self.regexed_items:
 			return
  
+		# work out every final name (and the order to apply them in) before touching the scene
+		plan = replacercore.plan_renames(self.selected_items, self.regexed_items, self.scene_index.snapshot().long_names)
+		if not len(plan):
+			return
+ 
 		# confirm dialog
-		number_different = len([x for x in self.regexed_items if x[1]])
-		dialog_msg = 'Confirm rename of ' + str(number_different) + ' objects?'
+		dialog_msg = 'Confirm rename of ' + str(len(plan)) + ' objects?'
+		if len(plan.adjusted()):
+			dialog_msg += '\n' + str(len(plan.adjusted())) + ' names are taken and will be numbered (see Dry Run).'
 		dialog_result = mc.confirmDialog(title='Maximum Replacer', message=dialog_msg, button=['Yes', 'No'], defaultButton='Yes', cancelButton='No', dismissString='No')
 		if 'No' == dialog_result:
 			return
  
-		# undo chunk for all names
-		mc.undoInfo(openChunk=True, chunkName='MaximumReplacer')
- 
-		# rename all objects (in REVERSE order as to not break the hierarchy)
-		for x in reversed(range(len(self.selected_items))):
-			# ignore nodes that don't need changing
-			if not self.regexed_items[x][1]:
-				continue
-				
-			old_name = self.selected_items[x][1] # old LONG name
-			new_name = self.regexed_items[x][0] # new SHORT name
-			
-			try:
-				mc.rename(old_name, new_name)
-			except Exception as e:
-				print 'Failed to rename %s: %s' % (old_name, e)
- 
-		# end chunk!
-		mc.undoInfo(closeChunk=True)
+		# all renames in one undo chunk
+		for long_name, new_name, error in replacercore.apply_rename_plan(plan):
+			print 'Failed to rename %s: %s' % (long_name, error)
  
 		# refresh view
 		self.update()
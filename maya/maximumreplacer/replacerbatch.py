@@ -0,0 +1,120 @@
+#
+# Maximum Replacer Batch
+# Daniel Green, 2019
+# GitHub: KasumiL5x
+#
+# Runs Maximum Replacer over many scene files without a UI, one mayapy worker process per core.
+# Each scene gets a JSON report of what was (or, with --dry-run, would be) renamed.
+#
+#   mayapy replacerbatch.py --pattern "^L_" --subs "left_" --type transform scenes/*.ma
+#
+# sceneindex.py and stageprofiler.py must be importable; their folders next to this one are added to the path automatically.
+
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import multiprocessing
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(SCRIPT_DIR)
+sys.path.append(os.path.join(SCRIPT_DIR, '..', 'sceneindex'))
+sys.path.append(os.path.join(SCRIPT_DIR, '..', 'stageprofiler'))
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description='Rename nodes in many Maya scenes using regular expressions.')
+	parser.add_argument('scenes', nargs='+', help='.ma/.mb files to process')
+	parser.add_argument('--name', default='', help='only nodes whose short name matches this expression')
+	parser.add_argument('--type', default='', help='only nodes whose type matches this expression')
+	parser.add_argument('--pattern', default='', help='expression to replace in node names')
+	parser.add_argument('--subs', default='', help='substitution for --pattern')
+	parser.add_argument('--preset', default=None, help='saved Maximum Replacer preset to run before --pattern')
+	parser.add_argument('--presets-file', default=None, help='presets JSON file (defaults to the one in Maya\'s prefs)')
+	parser.add_argument('--dry-run', action='store_true', help='report the renames without changing or saving anything')
+	parser.add_argument('--output-dir', default=None, help='save renamed scenes here instead of overwriting them')
+	parser.add_argument('--report-dir', default=None, help='write reports here instead of next to each scene')
+	parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='number of worker processes')
+	return parser.parse_args(argv)
+#end
+
+def init_worker():
+	import maya.standalone
+	maya.standalone.initialize(name='python')
+#end
+
+def report_path(scene, report_dir):
+	base = os.path.splitext(os.path.basename(scene))[0] + '.rename.json'
+	return os.path.join(report_dir or os.path.dirname(os.path.abspath(scene)), base)
+#end
+
+# Renames and saves a single scene, writing and returning its report.  Module-level for the pool.
+def process_scene(job):
+	scene, options = job
+	import maya.cmds as mc
+	import replacercore
+
+	report = {'scene': scene, 'dry_run': options['dry_run'], 'renamed': [], 'failed': [], 'error': None, 'saved_to': None}
+	start = time.time()
+	try:
+		preset_steps = None
+		if None != options['preset']:
+			preset_steps = replacercore.PresetStore(options['presets_file']).get(options['preset'])
+			if None == preset_steps:
+				raise ValueError('Preset not found: %s' % options['preset'])
+
+		mc.file(scene, open=True, force=True)
+		plan, failed = replacercore.rename(options['name'], options['type'], options['pattern'], options['subs'], dry_run=options['dry_run'], undoable=False, preset_steps=preset_steps)
+		report['renamed'] = [{'node': x[0], 'requested': x[1], 'final': x[2]} for x in plan.resolved]
+		report['failed'] = [{'node': x[0], 'name': x[1], 'error': x[2]} for x in failed]
+
+		if len(plan) and not options['dry_run']:
+			if None != options['output_dir']:
+				mc.file(rename=os.path.join(options['output_dir'], os.path.basename(scene)))
+			report['saved_to'] = mc.file(save=True, force=True)
+	except Exception:
+		report['error'] = traceback.format_exc()
+	report['seconds'] = time.time() - start
+
+	with open(report_path(scene, options['report_dir']), 'w') as f:
+		json.dump(report, f, indent=2)
+	return report
+#end
+
+def main(argv=None):
+	args = parse_args(sys.argv[1:] if None == argv else argv)
+	options = {
+		'name': args.name,
+		'type': args.type,
+		'pattern': args.pattern,
+		'subs': args.subs,
+		'preset': args.preset,
+		'presets_file': args.presets_file,
+		'dry_run': args.dry_run,
+		'output_dir': args.output_dir,
+		'report_dir': args.report_dir
+	}
+	for folder in [args.output_dir, args.report_dir]:
+		if None != folder and not os.path.isdir(folder):
+			os.makedirs(folder)
+
+	jobs = [(scene, options) for scene in args.scenes]
+	# each worker initializes Maya once and then opens its scenes one after another
+	pool = multiprocessing.Pool(max(1, min(args.processes, len(jobs))), init_worker)
+	try:
+		reports = pool.map(process_scene, jobs)
+	finally:
+		pool.close()
+		pool.join()
+
+	errors = 0
+	for report in reports:
+		if None != report['error'] or len(report['failed']):
+			errors += 1
+		print('%s: %d renamed, %d failed%s' % (report['scene'], len(report['renamed']), len(report['failed']), ' (error)' if None != report['error'] else ''))
+	return 1 if errors else 0
+#end
+
+if __name__ == '__main__':
+	sys.exit(main())
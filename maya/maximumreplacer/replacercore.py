@@ -0,0 +1,433 @@
+#
+# Maximum Replacer Core
+# Daniel Green, 2019
+# GitHub: KasumiL5x
+#
+# The select => filter => substitute => commit pipeline, free of any UI so that it can run
+# from the dialog, from mayapy (see replacerbatch.py), or against a stand-in maya.cmds.
+
+import os
+import re
+import json
+import operator
+import functools
+import multiprocessing
+import maya.cmds as mc
+import maya.api.OpenMaya as om
+import sceneindex
+import stageprofiler
+
+# how many nodes a background job processes between checks for cancellation
+CANCEL_CHECK_INTERVAL = 4096
+# names per chunk handed to each process when substituting with a pool
+POOL_CHUNK_SIZE = 50000
+ 
+# characters formValidObjectName replaces with underscores
+INVALID_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_]')
+VALID_FIRST_CHAR = re.compile(r'[a-zA-Z_]')
+# names are memoized up to this many entries, after which the cache starts over
+VALID_NAME_CACHE_SIZE = 100000
+g_valid_name_cache = {}
+ 
+# Python version of MEL's formValidObjectName (others/formValidObjectName.mel), so that
+# previews never round-trip through the MEL interpreter and quotes in names can't break it.
+# An empty name becomes 'defaultObject', every character outside [a-zA-Z0-9_] becomes an
+# underscore, and a name that then starts with a digit gets an underscore prefixed.
+def form_valid_object_name(name):
+	try:
+		return g_valid_name_cache[name]
+	except KeyError:
+		pass
+ 
+	if not len(name):
+		valid_name = 'defaultObject'
+	else:
+		valid_name = INVALID_NAME_CHARS.sub('_', name)
+		if None == VALID_FIRST_CHAR.match(valid_name):
+			valid_name = '_' + valid_name
+ 
+	if len(g_valid_name_cache) >= VALID_NAME_CACHE_SIZE:
+		g_valid_name_cache.clear()
+	g_valid_name_cache[name] = valid_name
+	return valid_name
+#end
+ 
+# [(compiled_pattern, substitution), ...] for the valid steps of [(pattern, substitution), ...]
+def compile_steps(steps):
+	compiled = [(sceneindex.compile_pattern(pattern), subs) for pattern, subs in steps]
+	return [x for x in compiled if None != x[0]]
+#end
+ 
+# single function applying every compiled step to a name in turn
+def make_substituter(compiled_steps):
+	funcs = [functools.partial(regex.sub, subs) for regex, subs in compiled_steps]
+	if 1 == len(funcs):
+		return funcs[0]
+	def substitute(name):
+		for func in funcs:
+			name = func(name)
+		return name
+	return substitute
+#end
+ 
+# name with each substituter applied in turn, skipping any that raise for it
+def substitute_name(name, substituters):
+	for func in substituters:
+		try:
+			name = func(name)
+		except:
+			continue
+	return name
+#end
+ 
+# Substitutes a chunk of names with one map of all compiled steps, returning (new_names, changed)
+# where changed is a bytearray mask.  make_valid is applied to changed names only (pass None to
+# skip it).  Module-level so pool processes can pickle it.
+def substitute_chunk(args):
+	names, compiled_steps, make_valid = args
+	try:
+		subbed = list(map(make_substituter(compiled_steps), names))
+	except:
+		# a substitution can fail for just some names (e.g. python 2 with a group that didn't take part in
+		# the match), so redo the chunk name by name, passing each through only the steps that fail for it
+		substituters = [make_substituter([x]) for x in compiled_steps]
+		subbed = [substitute_name(x, substituters) for x in names]
+	changed = bytearray(map(operator.ne, subbed, names))
+ 
+	# existing names are already valid, so only new ones need making maya-valid
+	if None != make_valid:
+		idx = changed.find(b'\x01')
+		while -1 != idx:
+			subbed[idx] = make_valid(subbed[idx])
+			changed[idx] = subbed[idx] != names[idx]
+			idx = changed.find(b'\x01', idx + 1)
+ 
+	return (subbed, changed)
+#end
+ 
+# Substitutes a whole column of names at once, returning (new_names, changed) where changed is a
+# bytearray mask, or None if cancelled (a threading.Event) gets set part way through.  steps is
+# [(pattern, substitution), ...] applied in order to each name in a single pass; patterns are
+# compiled once and invalid ones are skipped.  With processes > 1, very large columns are chunked
+# across a multiprocessing pool; only do that outside of an interactive Maya.
+@stageprofiler.timed('replacer.substitute')
+def substitute_column(names, steps, make_valid=form_valid_object_name, cancelled=None, processes=0):
+	compiled_steps = compile_steps(steps)
+	if not len(compiled_steps):
+		return (list(names), bytearray(len(names)))
+ 
+	results = []
+	if processes > 1 and len(names) > POOL_CHUNK_SIZE:
+		chunks = [(names[x:x+POOL_CHUNK_SIZE], compiled_steps, make_valid) for x in range(0, len(names), POOL_CHUNK_SIZE)]
+		pool = multiprocessing.Pool(processes)
+		try:
+			results = pool.map(substitute_chunk, chunks)
+		finally:
+			pool.close()
+			pool.join()
+	else:
+		for x in range(0, len(names), CANCEL_CHECK_INTERVAL):
+			if None != cancelled and cancelled.is_set():
+				return None
+			results.append(substitute_chunk((names[x:x+CANCEL_CHECK_INTERVAL], compiled_steps, make_valid)))
+ 
+	new_names = []
+	changed = bytearray()
+	for chunk_names, chunk_changed in results:
+		new_names.extend(chunk_names)
+		changed.extend(chunk_changed)
+	return (new_names, changed)
+#end
+ 
+# Computes (selected_items, regexed_items) from a snapshot without touching Maya.
+# steps is [(pattern, substitution), ...] as in substitute_column.
+# Returns None if cancelled (a threading.Event) gets set part way through.
+def compute_preview(snapshot, filter_name, filter_type, steps, make_valid=form_valid_object_name, cancelled=None):
+	selected_items = []
+	with stageprofiler.stage('replacer.filter'):
+		for count, idx in enumerate(sceneindex.iter_filtered(snapshot, filter_name, filter_type)):
+			if None != cancelled and 0 == count % CANCEL_CHECK_INTERVAL and cancelled.is_set():
+				return None
+			selected_items.append((snapshot.short_names[idx], snapshot.long_names[idx]))
+ 
+	subbed = substitute_column([x[0] for x in selected_items], steps, make_valid, cancelled)
+	if None == subbed:
+		return None
+	regexed_items = list(zip(subbed[0], map(bool, subbed[1]))) # [(regexed_short_name, different_from_original), ...]
+ 
+	return (selected_items, regexed_items)
+#end
+ 
+# trailing digits Maya increments when a name is taken
+TRAILING_DIGITS = re.compile(r'^(.*?)(\d*)$')
+ 
+# (parent long name, short name) of a long name; the parent is None for DG nodes
+def split_long_name(long_name):
+	idx = long_name.rfind('|')
+	if -1 == idx:
+		return (None, long_name)
+	return (long_name[:idx], long_name[idx+1:])
+#end
+ 
+# name if it's free, otherwise the next free name Maya-style (foo => foo1, foo1 => foo2, ...)
+def next_free_name(name, is_taken):
+	if not is_taken(name):
+		return name
+	base, digits = TRAILING_DIGITS.match(name).groups()
+	number = (int(digits) + 1) if len(digits) else 1
+	while is_taken(base + str(number)):
+		number += 1
+	return base + str(number)
+#end
+ 
+# Tracks which names are in use.  DAG names only have to be unique among their siblings,
+# whereas DG names have to be unique across the whole scene (DAG nodes included).
+class NameOccupancy(object):
+	def __init__(self):
+		self.dag = {} # parent long name => {short name: count}
+		self.dag_counts = {} # short name => count over all DAG nodes
+		self.dg = {} # short name => count
+	#end
+ 
+	def add(self, parent, name, delta=1):
+		if None == parent:
+			self.dg[name] = self.dg.get(name, 0) + delta
+			return
+		siblings = self.dag.setdefault(parent, {})
+		siblings[name] = siblings.get(name, 0) + delta
+		self.dag_counts[name] = self.dag_counts.get(name, 0) + delta
+	#end
+ 
+	def remove(self, parent, name):
+		self.add(parent, name, -1)
+	#end
+ 
+	def is_taken(self, parent, name):
+		if self.dg.get(name, 0) > 0:
+			return True
+		if None == parent:
+			return self.dag_counts.get(name, 0) > 0
+		return self.dag.get(parent, {}).get(name, 0) > 0
+	#end
+#end
+ 
+# Complete, conflict-free rename worked out before anything in the scene changes.
+class RenamePlan(object):
+	def __init__(self):
+		# [(original_long_name, long_name_when_applied, new_short_name), ...] in the order they must be applied
+		self.steps = []
+		# [(original_long_name, requested_short_name, final_short_name), ...] one per renamed node
+		self.resolved = []
+	#end
+ 
+	def __len__(self):
+		return len(self.resolved)
+	#end
+ 
+	# entries whose requested name was taken and had to be changed
+	def adjusted(self):
+		return [x for x in self.resolved if x[1] != x[2]]
+	#end
+ 
+	def report(self):
+		lines = []
+		for long_name, requested, final in self.resolved:
+			if requested == final:
+				lines.append('%s => %s' % (long_name, final))
+			else:
+				lines.append('%s => %s (requested %s, which is taken)' % (long_name, final, requested))
+		return lines
+	#end
+#end
+ 
+# Builds a RenamePlan from MaximumReplacer's selected/regexed items, checking the new names
+# against every node in all_long_names.  Names that would clash get numbered like Maya would,
+# and nodes that need a name another renamed node still holds (e.g. swaps) go via a temporary name.
+@stageprofiler.timed('replacer.plan')
+def plan_renames(selected_items, regexed_items, all_long_names):
+	plan = RenamePlan()
+	renames = [(x[1], y[0]) for x, y in zip(selected_items, regexed_items) if y[1]]
+	renaming = set(x[0] for x in renames)
+ 
+	# names that stay put, plus names of renamed nodes still waiting for their turn
+	occupancy = NameOccupancy()
+	pending = NameOccupancy()
+	for long_name in all_long_names:
+		parent, name = split_long_name(long_name)
+		if long_name in renaming:
+			pending.add(parent, name)
+		else:
+			occupancy.add(parent, name)
+ 
+	# 1. resolve the final names
+	for long_name, requested in renames:
+		parent, name = split_long_name(long_name)
+		final = next_free_name(requested, lambda x: occupancy.is_taken(parent, x))
+		occupancy.add(parent, final)
+		# numbering can land back on the node's own name (pCube1 => pCube while pCube exists), which is no rename
+		if final == name:
+			pending.remove(parent, name)
+			continue
+		plan.resolved.append((long_name, requested, final))
+ 
+	# original long name => current short name, for the parts of paths that have been renamed
+	current_names = {}
+	def current_path(long_name):
+		parts = long_name.split('|')
+		for idx in range(1, len(parts)):
+			prefix = '|'.join(parts[:idx+1])
+			if prefix in current_names:
+				parts[idx] = current_names[prefix]
+		if 1 == len(parts):
+			return current_names.get(long_name, long_name)
+		return '|'.join(parts)
+	#end
+ 
+	# 2. order them, going through a temporary name if the final one isn't free yet
+	deferred = []
+	temp_count = 0
+	for long_name, requested, final in plan.resolved:
+		parent, name = split_long_name(long_name)
+		pending.remove(parent, name)
+		if pending.is_taken(parent, final):
+			temp_name = next_free_name('mrTemp%d' % temp_count, lambda x: occupancy.is_taken(parent, x) or pending.is_taken(parent, x))
+			temp_count += 1
+			plan.steps.append((long_name, current_path(long_name), temp_name))
+			current_names[long_name] = temp_name
+			deferred.append((long_name, final))
+		else:
+			plan.steps.append((long_name, current_path(long_name), final))
+			current_names[long_name] = final
+	# every renamed node has left its original name by now
+	for long_name, final in deferred:
+		plan.steps.append((long_name, current_path(long_name), final))
+		current_names[long_name] = final
+ 
+	return plan
+#end
+ 
+# Applies a RenamePlan.  Returns [(long_name, new_name, error), ...] for renames that failed.
+# When undoable, renames run inside one undo chunk; otherwise they're queued on a single
+# MDGModifier and applied with one doIt (faster, but script modifiers aren't undoable).
+@stageprofiler.timed('replacer.rename')
+def apply_rename_plan(plan, undoable=True):
+	failed = []
+ 
+	if not undoable:
+		# resolve every node up front, as paths change as soon as doIt runs
+		nodes = {}
+		queued = []
+		modifier = om.MDGModifier()
+		for original, path, new_name in plan.steps:
+			try:
+				if original not in nodes:
+					sel = om.MSelectionList()
+					sel.add(original)
+					nodes[original] = sel.getDependNode(0)
+				modifier.renameNode(nodes[original], new_name)
+				queued.append((original, new_name))
+			except Exception as e:
+				failed.append((original, new_name, str(e)))
+		try:
+			modifier.doIt()
+		except Exception:
+			# a single node that can't be renamed (read-only, locked, referenced) fails the whole batch, so undo
+			# whatever went through and rename one by one, reporting just the nodes that fail
+			modifier.undoIt()
+			for original, new_name in queued:
+				single = om.MDGModifier()
+				try:
+					single.renameNode(nodes[original], new_name)
+					single.doIt()
+				except Exception as e:
+					failed.append((original, new_name, str(e)))
+		return failed
+ 
+	mc.undoInfo(openChunk=True, chunkName='MaximumReplacer')
+	try:
+		for original, path, new_name in plan.steps:
+			try:
+				mc.rename(path, new_name)
+			except Exception as e:
+				failed.append((path, new_name, str(e)))
+	finally:
+		mc.undoInfo(closeChunk=True)
+	return failed
+#end
+
+# Runs the whole pipeline on the open scene and returns (plan, failures), where failures
+# is [(long_name, new_name, error), ...].  Nothing is renamed when dry_run is set.
+# preset_steps ([(pattern, substitution), ...], e.g. from a PresetStore) run before expr/subs.
+def rename(filter_name='', filter_type='', expr='', subs='', selected=False, dry_run=False, undoable=True, processes=0, preset_steps=None):
+	with stageprofiler.stage('replacer.ls'):
+		snapshot = sceneindex.SceneSnapshot.from_ls(selected)
+		all_long_names = sceneindex.SceneSnapshot.from_ls(False).long_names if selected else snapshot.long_names
+ 
+	with stageprofiler.stage('replacer.filter'):
+		selected_items = [(snapshot.short_names[idx], snapshot.long_names[idx]) for idx in sceneindex.iter_filtered(snapshot, filter_name, filter_type)]
+	steps = list(preset_steps or []) + [(expr, subs)]
+	new_names, changed = substitute_column([x[0] for x in selected_items], steps, processes=processes)
+	plan = plan_renames(selected_items, list(zip(new_names, map(bool, changed))), all_long_names)
+ 
+	if dry_run or not len(plan):
+		return (plan, [])
+	return (plan, apply_rename_plan(plan, undoable))
+#end
+ 
+# Named, ordered chains of (pattern, substitution) steps, stored as JSON in Maya's prefs folder.
+class PresetStore(object):
+	FILE_NAME = 'maximumreplacer_presets.json'
+ 
+	def __init__(self, path=None):
+		self.path = path or os.path.join(mc.internalVar(userPrefDir=True), PresetStore.FILE_NAME)
+		self.presets = [] # [(name, [(pattern, substitution), ...]), ...]
+		self.load()
+	#end
+ 
+	def load(self):
+		self.presets = []
+		if not os.path.isfile(self.path):
+			return
+		try:
+			with open(self.path, 'r') as f:
+				data = json.load(f)
+			for preset in data.get('presets', []):
+				self.presets.append((preset['name'], [(x['pattern'], x['subs']) for x in preset['steps']]))
+		except Exception as e:
+			mc.warning('Failed to read Maximum Replacer presets from %s: %s' % (self.path, e))
+	#end
+ 
+	def save(self):
+		data = {'version': 1, 'presets': [{'name': name, 'steps': [{'pattern': x[0], 'subs': x[1]} for x in steps]} for name, steps in self.presets]}
+		with open(self.path, 'w') as f:
+			json.dump(data, f, indent=2)
+	#end
+ 
+	def names(self):
+		return [x[0] for x in self.presets]
+	#end
+ 
+	def get(self, name):
+		for preset_name, steps in self.presets:
+			if preset_name == name:
+				return list(steps)
+		return None
+	#end
+ 
+	# adds or replaces a preset (keeping its position if it exists) and saves
+	def set(self, name, steps):
+		steps = [(x[0], x[1]) for x in steps if len(x[0])]
+		for idx, preset in enumerate(self.presets):
+			if preset[0] == name:
+				self.presets[idx] = (name, steps)
+				break
+		else:
+			self.presets.append((name, steps))
+		self.save()
+	#end
+ 
+	def remove(self, name):
+		self.presets = [x for x in self.presets if x[0] != name]
+		self.save()
+	#end
+#end
@@ -0,0 +1,368 @@
+#
+# Scene Index
+# Daniel Green, 2019
+# GitHub: KasumiL5x
+#
+# Shared, callback-maintained cache of every node's name, long name, and type.
+# Tools call acquire() when they open and release() when they close; while at least one
+# tool holds the index, node added/removed/renamed/reparented callbacks mark individual
+# nodes dirty and only those nodes are re-read the next time a snapshot is requested.
+
+import re
+import itertools
+from collections import OrderedDict
+import maya.cmds as mc
+import maya.api.OpenMaya as om
+
+try:
+	range = xrange # lazy ranges in python 2
+except NameError:
+	pass
+
+g_scene_index = None
+g_scene_index_users = 0
+
+# compiled patterns are kept for as long as Maya runs (across tool sessions), up to this many
+PATTERN_CACHE_SIZE = 512
+g_pattern_cache = {}
+
+# compiled pattern, or None if the pattern is empty or not (yet) a valid expression
+def compile_pattern(pattern):
+	if not len(pattern):
+		return None
+	try:
+		return g_pattern_cache[pattern]
+	except KeyError:
+		pass
+
+	try:
+		regex = re.compile(pattern)
+	except re.error:
+		regex = None
+	if len(g_pattern_cache) >= PATTERN_CACHE_SIZE:
+		g_pattern_cache.clear()
+	g_pattern_cache[pattern] = regex
+	return regex
+#end
+
+# Lazily yields the indices of snapshot nodes matching both patterns (type first, then name).
+# Empty or invalid patterns don't filter.  Being a generator, callers can stop early (e.g. islice).
+# Only the given indices are considered, if any.
+def iter_filtered(snapshot, name_pattern='', type_pattern='', names=None, indices=None):
+	type_re = compile_pattern(type_pattern)
+	if None != type_re:
+		# scenes only have a handful of distinct types, so match each of those once
+		buckets = snapshot.type_buckets()
+		matching_types = [x for x in buckets if None != type_re.search(x)]
+		if None == indices:
+			# go straight to the nodes of those types (merged back into scene order) without visiting any others
+			if 1 == len(matching_types):
+				indices = buckets[matching_types[0]]
+			else:
+				# the buckets are already sorted runs, which sort merges in linear time
+				indices = sorted(itertools.chain.from_iterable(buckets[x] for x in matching_types))
+		else:
+			matching_types = set(matching_types)
+			types = snapshot.types
+			indices = (idx for idx in indices if types[idx] in matching_types)
+	indices = iter(range(len(snapshot)) if None == indices else indices)
+
+	name_re = compile_pattern(name_pattern)
+	if None != name_re:
+		names = snapshot.short_names if None == names else names
+		search = name_re.search
+		indices = (idx for idx in indices if None != search(names[idx]))
+
+	return indices
+#end
+
+# characters that make a pattern more than a plain string
+REGEX_SPECIAL_CHARS = set('.^$*+?{}[]\\|()')
+
+# Longest prefix of pattern that compiles, and its expression, so that a half-typed pattern such as
+# 'arm_[' filters by 'arm_' rather than by nothing.
+def compile_filter(pattern):
+	while len(pattern):
+		regex = compile_pattern(pattern)
+		if None != regex:
+			return (regex, pattern)
+		pattern = pattern[:-1]
+	return (None, '')
+#end
+
+# True if whatever new matches, old matches too: old is empty, or new is old followed by plain characters
+# (each node matching new then has a match of old at the same position).  Escapes and (?...) groups at
+# the end of old could change meaning when extended, so those are never treated as refinements.
+def is_refinement(old, new):
+	if not len(old):
+		return True
+	if not new.startswith(old) or '(?' in old or '\\' in old[-4:]:
+		return False
+	return not any(x in REGEX_SPECIAL_CHARS for x in new[len(old):])
+#end
+
+# Filters a snapshot like iter_filtered, remembering the last result.  When the snapshot is unchanged and
+# the new patterns only narrow the last ones (typing more of a name), just the last matches are searched
+# rather than the whole scene.  Incomplete expressions filter by their longest valid prefix.
+class NodeFilter(object):
+	def __init__(self):
+		self.snapshot = None
+		self.names = None
+		self.name_pattern = ''
+		self.type_pattern = ''
+		self.indices = None
+	#end
+
+	# indices of the matching nodes, as a list
+	def filter(self, snapshot, name_pattern='', type_pattern='', names=None):
+		name_pattern = compile_filter(name_pattern)[1]
+		type_pattern = compile_filter(type_pattern)[1]
+
+		candidates = None
+		if snapshot is self.snapshot and names is self.names and None != self.indices:
+			if name_pattern == self.name_pattern and type_pattern == self.type_pattern:
+				return self.indices
+			if is_refinement(self.name_pattern, name_pattern) and is_refinement(self.type_pattern, type_pattern):
+				candidates = self.indices
+
+		self.indices = list(iter_filtered(snapshot, name_pattern, type_pattern, names, candidates))
+		self.snapshot = snapshot
+		self.names = names
+		self.name_pattern = name_pattern
+		self.type_pattern = type_pattern
+		return self.indices
+	#end
+#end
+
+# Columnar snapshot of the scene's nodes.
+# short_names[i], long_names[i], and types[i] all describe the same node.
+class SceneSnapshot(object):
+	def __init__(self, long_names=None, types=None):
+		self.long_names = long_names or []
+		self.types = types or []
+		# strip all after the last | (the |+1 becomes 0 if the find fails, so it's okay to fail)
+		self.short_names = [x[x.rfind('|')+1:] for x in self.long_names]
+		self._unique_names = None
+		self._type_buckets = None
+	#end
+
+	@classmethod
+	def from_ls(cls, selected=False):
+		# ls with showType returns a flat [name, type, name, type, ...] list
+		flat = mc.ls(sl=selected, long=True, showType=True) or []
+		return cls(flat[0::2], flat[1::2])
+	#end
+
+	def __len__(self):
+		return len(self.long_names)
+	#end
+
+	# short names where they are unique in the scene, long names otherwise (like ls does)
+	def unique_names(self):
+		if None == self._unique_names:
+			counts = {}
+			for x in self.short_names:
+				counts[x] = counts.get(x, 0) + 1
+			self._unique_names = [short if 1 == counts[short] else full for short, full in zip(self.short_names, self.long_names)]
+		return self._unique_names
+	#end
+
+	# node type => indices of its nodes in ascending order.  Built on first use; the index's snapshot is
+	# cached until callbacks report a change, so the buckets are too.
+	def type_buckets(self):
+		if None == self._type_buckets:
+			buckets = {}
+			for idx, node_type in enumerate(self.types):
+				try:
+					buckets[node_type].append(idx)
+				except KeyError:
+					buckets[node_type] = [idx]
+			self._type_buckets = buckets
+		return self._type_buckets
+	#end
+#end
+
+# scene messages after which the index is rebuilt from scratch rather than tracked node by node
+SCENE_CHANGE_MESSAGES = [
+	'kBeforeNew', 'kAfterNew',
+	'kBeforeOpen', 'kAfterOpen',
+	'kBeforeImport', 'kAfterImport',
+	'kBeforeCreateReference', 'kBeforeLoadReference', 'kBeforeUnloadReference', 'kBeforeRemoveReference'
+]
+
+class SceneIndex(object):
+	def __init__(self):
+		# uuid => [long_name, type] (or position => [long_name, type] while UUIDs aren't unique)
+		self.entries = OrderedDict()
+		# uuid => MObjectHandle of nodes that need re-reading
+		self.dirty = {}
+		# DAG nodes whose whole subtree needs re-reading (renamed or reparented)
+		self.dirty_dag_roots = []
+		self.needs_rebuild = True
+		self.snapshot_cache = None
+		self.callback_ids = []
+	#end
+
+	def install_callbacks(self):
+		if len(self.callback_ids):
+			return
+		self.callback_ids = [
+			om.MDGMessage.addNodeAddedCallback(self._on_node_added, 'dependNode'),
+			om.MDGMessage.addNodeRemovedCallback(self._on_node_removed, 'dependNode'),
+			om.MNodeMessage.addNameChangedCallback(om.MObject(), self._on_name_changed),
+			om.MDagMessage.addAllDagChangesCallback(self._on_dag_changed)
+		]
+		# invalidating before the scene (or a reference) is swapped out makes the per-node callbacks for all of
+		# its nodes return straight away, rather than tracking nodes that are about to be thrown away
+		for message in SCENE_CHANGE_MESSAGES:
+			self.callback_ids.append(om.MSceneMessage.addCallback(getattr(om.MSceneMessage, message), self._on_scene_changed))
+	#end
+
+	def remove_callbacks(self):
+		if len(self.callback_ids):
+			om.MMessage.removeCallbacks(self.callback_ids)
+		self.callback_ids = []
+		# nothing will tell us about changes anymore
+		self.needs_rebuild = True
+	#end
+
+	def invalidate(self):
+		self.needs_rebuild = True
+		self.snapshot_cache = None
+	#end
+
+	# snapshot of all nodes (cached), or of the current selection (always fresh, as it's small and not tracked)
+	def snapshot(self, selected=False):
+		if selected:
+			return SceneSnapshot.from_ls(True)
+
+		if self.needs_rebuild:
+			self._rebuild()
+		elif len(self.dirty) or len(self.dirty_dag_roots):
+			self._refresh_dirty()
+
+		if None == self.snapshot_cache:
+			values = self.entries.values()
+			self.snapshot_cache = SceneSnapshot([x[0] for x in values], [x[1] for x in values])
+		return self.snapshot_cache
+	#end
+
+	def _rebuild(self):
+		flat = mc.ls(long=True, showType=True) or []
+		uuids = mc.ls(uuid=True) or []
+		if len(uuids) * 2 != len(flat):
+			# instanced nodes can be listed differently, so fall back to asking per node
+			uuids = [(mc.ls(flat[idx], uuid=True) or [flat[idx]])[0] for idx in range(0, len(flat), 2)]
+		entries = [[flat[idx*2], flat[idx*2+1]] for idx in range(len(uuids))]
+		self.entries = OrderedDict(zip(uuids, entries))
+		self.dirty = {}
+		self.dirty_dag_roots = []
+		self.needs_rebuild = False
+		self.snapshot_cache = None
+
+		# UUIDs aren't guaranteed unique (e.g. the same file referenced twice), and then can't tell nodes apart;
+		# keep every node, but rebuild for each snapshot instead of tracking changes until a rebuild finds none
+		if len(self.entries) != len(uuids):
+			self.entries = OrderedDict(enumerate(entries))
+			self.needs_rebuild = True
+	#end
+
+	def _refresh_dirty(self):
+		# expand renamed/reparented DAG nodes into their whole subtree, as all of their long names changed
+		for handle in self.dirty_dag_roots:
+			if not handle.isValid():
+				continue
+			it = om.MItDag()
+			it.reset(handle.object())
+			while not it.isDone():
+				obj = it.currentItem()
+				self.dirty[self._uuid_of(obj)] = om.MObjectHandle(obj)
+				it.next()
+		self.dirty_dag_roots = []
+
+		for uuid, handle in self.dirty.items():
+			if not handle.isValid():
+				self.entries.pop(uuid, None)
+				continue
+			obj = handle.object()
+			fn = om.MFnDependencyNode(obj)
+			if obj.hasFn(om.MFn.kDagNode):
+				name = om.MFnDagNode(obj).fullPathName()
+			else:
+				name = fn.name()
+			self.entries[uuid] = [name, fn.typeName] # new nodes are appended, existing ones keep their order
+		self.dirty = {}
+		self.snapshot_cache = None
+	#end
+
+	def _uuid_of(self, obj):
+		return om.MFnDependencyNode(obj).uuid().asString()
+	#end
+
+	def _mark_dirty(self, obj):
+		if self.needs_rebuild:
+			return
+		self.dirty[self._uuid_of(obj)] = om.MObjectHandle(obj)
+		self.snapshot_cache = None
+	#end
+
+	def _on_node_added(self, node, client_data):
+		if self.needs_rebuild:
+			return
+		# a new node sharing a UUID with another (e.g. referencing a file again) needs the rebuild to notice
+		if self._uuid_of(node) in self.entries:
+			self.invalidate()
+			return
+		self._mark_dirty(node)
+	#end
+
+	def _on_node_removed(self, node, client_data):
+		if self.needs_rebuild:
+			return
+		uuid = self._uuid_of(node)
+		self.dirty.pop(uuid, None)
+		if None != self.entries.pop(uuid, None):
+			self.snapshot_cache = None
+	#end
+
+	def _on_name_changed(self, node, prev_name, client_data):
+		if self.needs_rebuild:
+			return
+		if node.hasFn(om.MFn.kDagNode):
+			self.dirty_dag_roots.append(om.MObjectHandle(node))
+			self.snapshot_cache = None
+		else:
+			self._mark_dirty(node)
+	#end
+
+	def _on_dag_changed(self, msg_type, child, parent, client_data):
+		if self.needs_rebuild:
+			return
+		# child and parent are MDagPaths here, not MObjects
+		self.dirty_dag_roots.append(om.MObjectHandle(child.node()))
+		self.snapshot_cache = None
+	#end
+
+	def _on_scene_changed(self, client_data):
+		self.invalidate()
+	#end
+#end
+
+# register a user of the shared index and return it; pair with release()
+def acquire():
+	global g_scene_index, g_scene_index_users
+
+	if None == g_scene_index:
+		g_scene_index = SceneIndex()
+	g_scene_index_users += 1
+	g_scene_index.install_callbacks()
+	return g_scene_index
+#end
+
+def release():
+	global g_scene_index_users
+
+	g_scene_index_users = max(0, g_scene_index_users - 1)
+	if 0 == g_scene_index_users and None != g_scene_index:
+		g_scene_index.remove_callbacks()
+#end
@@ -0,0 +1,325 @@
+#
+# Scene Index Tests
+# Daniel Green, 2019
+# GitHub: KasumiL5x
+#
+# Exercises SceneIndex's rebuild, dirty refresh, and callbacks against a small fake of maya.cmds and
+# OpenMaya, so it runs with plain python (no Maya needed): python test_sceneindex.py
+
+import os
+import sys
+import types
+import unittest
+
+# Fake scene: nodes with a name, type, UUID, and (for DAG nodes) a parent.  Only the parts of cmds and
+# OpenMaya that sceneindex uses are faked; callbacks are stored by kind so tests can fire them.
+class FakeNode(object):
+	def __init__(self, name, node_type, uuid, parent=None, dag=True):
+		self.name = name
+		self.type = node_type
+		self.uuid = uuid
+		self.parent = parent
+		self.dag = dag
+		self.alive = True
+	#end
+
+	def long_name(self):
+		if not self.dag:
+			return self.name
+		return (self.parent.long_name() if None != self.parent else '') + '|' + self.name
+	#end
+
+	def hasFn(self, fn):
+		return self.dag
+	#end
+#end
+
+class FakeScene(object):
+	def __init__(self):
+		self.nodes = []
+		self.callbacks = {}
+		self.next_uuid = 0
+	#end
+
+	def add(self, name, node_type='transform', parent=None, dag=True, uuid=None):
+		if None == uuid:
+			self.next_uuid += 1
+			uuid = 'UUID-%d' % self.next_uuid
+		node = FakeNode(name, node_type, uuid, parent, dag)
+		self.nodes.append(node)
+		return node
+	#end
+
+	def live(self):
+		return [x for x in self.nodes if x.alive]
+	#end
+
+	def descendants(self, node):
+		result = [node]
+		for x in self.live():
+			if x.parent is node:
+				result.extend(self.descendants(x))
+		return result
+	#end
+
+	def fire(self, kind, *args):
+		self.callbacks[kind](*args)
+	#end
+#end
+
+g_scene = FakeScene()
+
+def fake_ls(*args, **kwargs):
+	nodes = g_scene.live()
+	if len(args):
+		nodes = [x for x in nodes if x.long_name() == args[0]]
+	if kwargs.get('uuid', False):
+		return [x.uuid for x in nodes]
+	flat = []
+	for x in nodes:
+		flat.extend([x.long_name(), x.type])
+	return flat
+#end
+
+def register(kind):
+	def add_callback(*args):
+		func = [x for x in args if callable(x)][0]
+		key = args[0] if 'scene' == kind else kind
+		g_scene.callbacks[key] = func
+		return key
+	return staticmethod(add_callback)
+#end
+
+def remove_callbacks(ids):
+	for x in ids:
+		g_scene.callbacks.pop(x, None)
+#end
+
+class FakeObjectHandle(object):
+	def __init__(self, obj):
+		if not isinstance(obj, FakeNode):
+			raise TypeError('MObjectHandle needs an MObject')
+		self.obj = obj
+	#end
+
+	def isValid(self):
+		return self.obj.alive
+	#end
+
+	def object(self):
+		return self.obj
+	#end
+#end
+
+class FakeUuid(object):
+	def __init__(self, value):
+		self.value = value
+	#end
+
+	def asString(self):
+		return self.value
+	#end
+#end
+
+class FakeDependencyNode(object):
+	def __init__(self, obj):
+		self.obj = obj
+		self.typeName = obj.type
+	#end
+
+	def name(self):
+		return self.obj.name
+	#end
+
+	def uuid(self):
+		return FakeUuid(self.obj.uuid)
+	#end
+#end
+
+class FakeDagNode(FakeDependencyNode):
+	def fullPathName(self):
+		return self.obj.long_name()
+	#end
+#end
+
+class FakeDagPath(object):
+	def __init__(self, obj):
+		self.obj = obj
+	#end
+
+	def node(self):
+		return self.obj
+	#end
+#end
+
+class FakeItDag(object):
+	def reset(self, obj):
+		self.items = g_scene.descendants(obj)
+		self.idx = 0
+	#end
+
+	def isDone(self):
+		return self.idx >= len(self.items)
+	#end
+
+	def currentItem(self):
+		return self.items[self.idx]
+	#end
+
+	def next(self):
+		self.idx += 1
+	#end
+#end
+
+def install_fake_maya():
+	cmds = types.ModuleType('maya.cmds')
+	cmds.ls = fake_ls
+	om = types.ModuleType('maya.api.OpenMaya')
+	om.MObject = object
+	om.MObjectHandle = FakeObjectHandle
+	om.MFnDependencyNode = FakeDependencyNode
+	om.MFnDagNode = FakeDagNode
+	om.MItDag = FakeItDag
+	om.MFn = type('MFn', (object,), {'kDagNode': 1})
+	om.MDGMessage = type('MDGMessage', (object,), {'addNodeAddedCallback': register('added'), 'addNodeRemovedCallback': register('removed')})
+	om.MNodeMessage = type('MNodeMessage', (object,), {'addNameChangedCallback': register('renamed')})
+	om.MDagMessage = type('MDagMessage', (object,), {'addAllDagChangesCallback': register('dag')})
+	scene_message = dict((x, x) for x in ['kBeforeNew', 'kAfterNew', 'kBeforeOpen', 'kAfterOpen', 'kBeforeImport', 'kAfterImport', 'kBeforeCreateReference', 'kBeforeLoadReference', 'kBeforeUnloadReference', 'kBeforeRemoveReference'])
+	scene_message['addCallback'] = register('scene')
+	om.MSceneMessage = type('MSceneMessage', (object,), scene_message)
+	om.MMessage = type('MMessage', (object,), {'removeCallbacks': staticmethod(remove_callbacks)})
+
+	maya = types.ModuleType('maya')
+	api = types.ModuleType('maya.api')
+	maya.cmds = cmds
+	maya.api = api
+	api.OpenMaya = om
+	sys.modules.update({'maya': maya, 'maya.cmds': cmds, 'maya.api': api, 'maya.api.OpenMaya': om})
+#end
+
+install_fake_maya()
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import sceneindex
+
+class SceneIndexTest(unittest.TestCase):
+	def setUp(self):
+		global g_scene
+		g_scene = FakeScene()
+		self.root = g_scene.add('root')
+		self.arm = g_scene.add('arm', parent=self.root)
+		self.shape = g_scene.add('armShape', 'mesh', parent=self.arm)
+		self.material = g_scene.add('lambert1', 'lambert', dag=False)
+		self.index = sceneindex.SceneIndex()
+		self.index.install_callbacks()
+		self.index.snapshot()
+	#end
+
+	def tearDown(self):
+		self.index.remove_callbacks()
+	#end
+
+	def assertMatchesScene(self):
+		snapshot = self.index.snapshot()
+		self.assertEqual(sorted(zip(snapshot.long_names, snapshot.types)), sorted((x.long_name(), x.type) for x in g_scene.live()))
+	#end
+
+	def test_rebuild(self):
+		snapshot = self.index.snapshot()
+		self.assertEqual(snapshot.long_names, ['|root', '|root|arm', '|root|arm|armShape', 'lambert1'])
+		self.assertEqual(snapshot.types, ['transform', 'transform', 'mesh', 'lambert'])
+		self.assertFalse(self.index.needs_rebuild)
+	#end
+
+	def test_unchanged_snapshot_is_cached(self):
+		self.assertTrue(self.index.snapshot() is self.index.snapshot())
+	#end
+
+	def test_node_added(self):
+		leg = g_scene.add('leg', parent=self.root)
+		g_scene.fire('added', leg, None)
+		self.assertEqual(list(self.index.dirty), [leg.uuid])
+		self.assertEqual(self.index.snapshot().long_names[-1], '|root|leg')
+		self.assertFalse(self.index.needs_rebuild)
+	#end
+
+	def test_node_removed(self):
+		self.material.alive = False
+		g_scene.fire('removed', self.material, None)
+		self.assertMatchesScene()
+	#end
+
+	def test_dg_rename(self):
+		self.material.name = 'skin'
+		g_scene.fire('renamed', self.material, 'lambert1', None)
+		self.assertMatchesScene()
+	#end
+
+	def test_dag_rename_updates_children(self):
+		self.arm.name = 'L_arm'
+		g_scene.fire('renamed', self.arm, 'arm', None)
+		self.assertIn('|root|L_arm|armShape', self.index.snapshot().long_names)
+		self.assertMatchesScene()
+	#end
+
+	def test_reparent_and_ungroup(self):
+		# the DAG callback gets MDagPaths, not MObjects
+		self.arm.parent = None
+		g_scene.fire('dag', 0, FakeDagPath(self.arm), FakeDagPath(self.root), None)
+		self.assertIn('|arm|armShape', self.index.snapshot().long_names)
+		self.assertMatchesScene()
+		self.arm.parent = self.root
+		g_scene.fire('dag', 0, FakeDagPath(self.arm), FakeDagPath(self.root), None)
+		self.assertMatchesScene()
+	#end
+
+	def test_deleted_dirty_node_is_dropped(self):
+		leg = g_scene.add('leg')
+		g_scene.fire('added', leg, None)
+		leg.alive = False
+		self.assertMatchesScene()
+	#end
+
+	def test_duplicate_uuids_keep_every_node(self):
+		first = g_scene.add('ref1:ctrl', uuid='SHARED')
+		second = g_scene.add('ref2:ctrl', uuid='SHARED')
+		self.index.invalidate()
+		self.assertMatchesScene()
+		# untracked while the UUIDs clash: every snapshot is a plain rebuild
+		self.assertTrue(self.index.needs_rebuild)
+		second.alive = False
+		g_scene.fire('removed', second, None)
+		self.assertMatchesScene()
+		# unique again, so tracking resumes
+		self.assertFalse(self.index.needs_rebuild)
+		self.assertIn('|ref1:ctrl', self.index.snapshot().long_names)
+	#end
+
+	def test_added_node_with_existing_uuid_rebuilds(self):
+		copy = g_scene.add('ref2:arm', uuid=self.arm.uuid)
+		g_scene.fire('added', copy, None)
+		self.assertTrue(self.index.needs_rebuild)
+		self.assertMatchesScene()
+	#end
+
+	def test_scene_swap_skips_per_node_work(self):
+		g_scene.fire('kBeforeOpen', None)
+		self.assertTrue(self.index.needs_rebuild)
+		for x in g_scene.live():
+			x.alive = False
+			g_scene.fire('removed', x, None)
+		opened = g_scene.add('opened')
+		g_scene.fire('added', opened, None)
+		self.assertEqual(self.index.dirty, {})
+		g_scene.fire('kAfterOpen', None)
+		self.assertEqual(self.index.snapshot().long_names, ['|opened'])
+	#end
+
+	def test_remove_callbacks(self):
+		self.index.remove_callbacks()
+		self.assertEqual(g_scene.callbacks, {})
+		self.assertTrue(self.index.needs_rebuild)
+	#end
+#end
+
+if __name__ == '__main__':
+	unittest.main()
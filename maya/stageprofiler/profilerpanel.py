@@ -0,0 +1,120 @@
+#
+# Stage Profiler Panel
+# Daniel Green, 2019
+# GitHub: KasumiL5x
+#
+# Small window over stageprofiler.py: turn profiling on, use the tools, and watch where the time goes.
+# The stages can be saved as JSON or as a .prof file for pstats/snakeviz.
+
+import PySide2.QtCore as QtCore
+import PySide2.QtWidgets as QtWidgets
+import stageprofiler
+
+g_panel = None
+
+# how often the table refreshes while the panel is open
+REFRESH_INTERVAL_MS = 1000
+
+class ProfilerPanel(QtWidgets.QDialog):
+	def __init__(self):
+		QtWidgets.QDialog.__init__(self)
+
+		self.setWindowFlags(QtCore.Qt.WindowStaysOnTopHint)
+		self.setWindowTitle('Stage Profiler')
+		self.setMinimumWidth(480)
+		self.setMinimumHeight(260)
+
+		self.setLayout(QtWidgets.QVBoxLayout())
+		self.layout().setContentsMargins(5, 5, 5, 5)
+		self.layout().setSpacing(5)
+
+		# controls
+		controls_widget = QtWidgets.QWidget()
+		controls_widget.setLayout(QtWidgets.QHBoxLayout())
+		controls_widget.layout().setContentsMargins(0, 0, 0, 0)
+		controls_widget.layout().setSpacing(5)
+		self.layout().addWidget(controls_widget)
+		self.enabled_chk = QtWidgets.QCheckBox()
+		self.enabled_chk.setText('Enabled')
+		self.enabled_chk.setChecked(stageprofiler.is_enabled())
+		controls_widget.layout().addWidget(self.enabled_chk)
+		controls_widget.layout().addStretch()
+		self.reset_btn = QtWidgets.QPushButton()
+		self.reset_btn.setText('Reset')
+		controls_widget.layout().addWidget(self.reset_btn)
+		self.save_json_btn = QtWidgets.QPushButton()
+		self.save_json_btn.setText('Save JSON...')
+		controls_widget.layout().addWidget(self.save_json_btn)
+		self.save_pstats_btn = QtWidgets.QPushButton()
+		self.save_pstats_btn.setText('Save .prof...')
+		controls_widget.layout().addWidget(self.save_pstats_btn)
+
+		# stages table
+		self.stages_table = QtWidgets.QTableWidget()
+		self.stages_table.setColumnCount(5)
+		self.stages_table.setHorizontalHeaderLabels(['Stage', 'Calls', 'Total (ms)', 'Own (ms)', 'Max (ms)'])
+		self.stages_table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+		self.stages_table.verticalHeader().setVisible(False)
+		self.stages_table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+		self.layout().addWidget(self.stages_table)
+
+		# connections
+		self.enabled_chk.toggled.connect(stageprofiler.enable)
+		self.reset_btn.clicked.connect(self.on_reset_clicked)
+		self.save_json_btn.clicked.connect(self.on_save_json_clicked)
+		self.save_pstats_btn.clicked.connect(self.on_save_pstats_clicked)
+
+		self.refresh_timer = QtCore.QTimer(self)
+		self.refresh_timer.setInterval(REFRESH_INTERVAL_MS)
+		self.refresh_timer.timeout.connect(self.refresh)
+		self.refresh_timer.start()
+		self.refresh()
+	#end
+
+	def refresh(self):
+		rows = stageprofiler.stats()
+		self.stages_table.setRowCount(len(rows))
+		for row, (name, calls, total, own, longest) in enumerate(rows):
+			values = [name, str(calls), '%.2f' % (total * 1000.0), '%.2f' % (own * 1000.0), '%.2f' % (longest * 1000.0)]
+			for column, value in enumerate(values):
+				item = QtWidgets.QTableWidgetItem(value)
+				if column:
+					item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+				self.stages_table.setItem(row, column, item)
+	#end
+
+	def on_reset_clicked(self):
+		stageprofiler.reset()
+		self.refresh()
+	#end
+
+	def on_save_json_clicked(self):
+		path = QtWidgets.QFileDialog.getSaveFileName(self, 'Save Stages', 'stages.json', 'JSON (*.json)')[0]
+		if len(path):
+			stageprofiler.dump_json(path)
+	#end
+
+	def on_save_pstats_clicked(self):
+		path = QtWidgets.QFileDialog.getSaveFileName(self, 'Save Stages', 'stages.prof', 'Profile (*.prof)')[0]
+		if len(path):
+			stageprofiler.dump_pstats(path)
+	#end
+
+	def closeEvent(self, event):
+		self.refresh_timer.stop()
+		QtWidgets.QDialog.closeEvent(self, event)
+	#end
+#end
+
+def create():
+	global g_panel
+
+	try:
+		g_panel.close()
+		g_panel.deleteLater()
+	except:
+		pass
+	g_panel = ProfilerPanel()
+	g_panel.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+	g_panel.show()
+#end
@@ -0,0 +1,145 @@
+#
+# Stage Profiler
+# Daniel Green, 2019
+# GitHub: KasumiL5x
+#
+# Opt-in timing of named stages (listing nodes, filtering, reading attributes, rebuilding views, ...)
+# shared by the tools.  Wrap code in `with stage('name'):` or decorate functions with @timed('name');
+# while disabled (the default) both cost a flag check.  Call enable() (or tick the box in
+# profilerpanel.py), use the tools, then look at stats() or dump them with dump_json()/dump_pstats().
+
+import time
+import json
+import marshal
+import functools
+import threading
+from collections import OrderedDict
+
+g_enabled = False
+# name => [calls, total seconds, own seconds (excluding nested stages), longest call, {caller name => [calls, own, total]}]
+g_stages = OrderedDict()
+g_lock = threading.Lock()
+# stack of [name, seconds spent in nested stages] per thread, so nested and background stages add up properly
+g_active = threading.local()
+
+def enable(enabled=True):
+	global g_enabled
+	g_enabled = enabled
+#end
+
+def is_enabled():
+	return g_enabled
+#end
+
+def reset():
+	with g_lock:
+		g_stages.clear()
+#end
+
+def record(name, seconds, own=None, caller=None):
+	own = seconds if None == own else own
+	with g_lock:
+		entry = g_stages.get(name)
+		if None == entry:
+			entry = g_stages[name] = [0, 0.0, 0.0, 0.0, {}]
+		entry[0] += 1
+		entry[1] += seconds
+		entry[2] += own
+		entry[3] = max(entry[3], seconds)
+		if None != caller:
+			callers = entry[4].setdefault(caller, [0, 0.0, 0.0])
+			callers[0] += 1
+			callers[1] += own
+			callers[2] += seconds
+#end
+
+class Stage(object):
+	__slots__ = ['name', 'start', 'stack']
+
+	def __init__(self, name):
+		self.name = name
+	#end
+
+	def __enter__(self):
+		try:
+			self.stack = g_active.stack
+		except AttributeError:
+			self.stack = g_active.stack = []
+		self.stack.append([self.name, 0.0])
+		self.start = time.time()
+		return self
+	#end
+
+	def __exit__(self, exc_type, exc_value, tb):
+		elapsed = time.time() - self.start
+		nested = self.stack.pop()[1]
+		caller = None
+		if len(self.stack):
+			self.stack[-1][1] += elapsed
+			caller = self.stack[-1][0]
+		record(self.name, elapsed, elapsed - nested, caller)
+		return False
+	#end
+#end
+
+# what stage() hands out while disabled
+class NullStage(object):
+	__slots__ = []
+
+	def __enter__(self):
+		return self
+	#end
+
+	def __exit__(self, exc_type, exc_value, tb):
+		return False
+	#end
+#end
+NULL_STAGE = NullStage()
+
+def stage(name):
+	return Stage(name) if g_enabled else NULL_STAGE
+#end
+
+# decorator timing every call of a function as the stage name
+def timed(name):
+	def decorator(func):
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			if not g_enabled:
+				return func(*args, **kwargs)
+			with Stage(name):
+				return func(*args, **kwargs)
+		return wrapper
+	return decorator
+#end
+
+# [(name, calls, total seconds, own seconds, longest call), ...] with the most expensive first
+def stats():
+	with g_lock:
+		rows = [(name, x[0], x[1], x[2], x[3]) for name, x in g_stages.items()]
+	return sorted(rows, key=lambda x: x[2], reverse=True)
+#end
+
+def dump_json(path):
+	with g_lock:
+		data = OrderedDict()
+		for name, x in g_stages.items():
+			data[name] = {'calls': x[0], 'total': x[1], 'own': x[2], 'max': x[3], 'callers': dict((caller, {'calls': c[0], 'own': c[1], 'total': c[2]}) for caller, c in x[4].items())}
+	with open(path, 'w') as f:
+		json.dump(data, f, indent=2)
+#end
+
+# Writes the stages in the format cProfile's dump_stats does, so pstats, snakeviz, etc. can read it.
+# Each stage is a 'function' named after it, with nested stages recorded as its callees.
+def dump_pstats(path):
+	def key(name):
+		return ('stage', 0, name)
+
+	with g_lock:
+		stats_dict = {}
+		for name, x in g_stages.items():
+			callers = dict((key(caller), (c[0], c[0], c[1], c[2])) for caller, c in x[4].items())
+			stats_dict[key(name)] = (x[0], x[0], x[2], x[1], callers)
+	with open(path, 'wb') as f:
+		marshal.dump(stats_dict, f)
+#end
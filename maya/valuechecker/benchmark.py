@@ -0,0 +1,123 @@
+#
+# Value Checker Benchmarks
+# Daniel Green, 2019
+# GitHub: KasumiL5x
+#
+# Synthetic timings for the comparison kernel and the node filter; no scene is touched.
+# Run from mayapy (so the maya imports resolve): mayapy benchmark.py
+
+import os
+import re
+import sys
+import time
+import random
+from array import array
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sceneindex'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'stageprofiler'))
+import sceneindex
+import checkercore
+
+NODE_TYPES = ['transform', 'mesh', 'joint', 'nurbsCurve', 'shadingEngine', 'lambert', 'animCurveTL', 'locator']
+SIDES = ['L', 'R', 'C']
+PARTS = ['arm', 'leg', 'spine', 'neck', 'finger', 'toe', 'prop', 'geo']
+
+def make_values(count, seed=0):
+	rng = random.Random(seed)
+	# mostly zero, like the translations of a clean rig
+	return array('d', (0.0 if rng.random() < 0.9 else rng.uniform(-10.0, 10.0) for _ in range(count)))
+#end
+
+# the original per-element comparison (are_equal with its type checks, called once per value)
+def legacy_are_equal(a, b):
+	if type(a) != type(b):
+		return False
+	if isinstance(a, int):
+		return a == b
+	if isinstance(a, float):
+		return abs(b - a) < checkercore.EPSILON
+	return False
+#end
+
+def legacy_compare(values, expected):
+	return [idx for idx, value in enumerate(values) if not legacy_are_equal(expected, value)]
+#end
+
+def make_snapshot(count, seed=0):
+	rng = random.Random(seed)
+	long_names = []
+	types = []
+	for idx in range(count):
+		name = '%s_%s_%s_%06d' % (rng.choice(SIDES), rng.choice(PARTS), rng.choice(['ctrl', 'jnt', 'grp', 'geo']), idx)
+		long_names.append('|root|' + name)
+		types.append(rng.choice(NODE_TYPES))
+	return sceneindex.SceneSnapshot(long_names, types)
+#end
+
+# the original update_filtered_objects loop, with a re.search per node and pattern
+def legacy_filter(snapshot, name_filter, type_filter):
+	to_add = []
+	for node_name, node_type in zip(snapshot.unique_names(), snapshot.types):
+		if len(name_filter) and re.search(name_filter, node_name) is None:
+			continue
+		if len(type_filter) and re.search(type_filter, node_type) is None:
+			continue
+		to_add.append(node_name)
+	return to_add
+#end
+
+# every keystroke of typing the pattern, as the filter box sees it
+def typing(pattern):
+	return [pattern[:x] for x in range(1, len(pattern) + 1)]
+#end
+
+def legacy_typing(snapshot, keystrokes, type_filter):
+	for pattern in keystrokes:
+		try:
+			result = legacy_filter(snapshot, pattern, type_filter)
+		except re.error:
+			pass # the original raised out of the slot here
+	return result
+#end
+
+def filter_typing(snapshot, keystrokes, type_filter):
+	node_filter = sceneindex.NodeFilter()
+	for pattern in keystrokes:
+		result = node_filter.filter(snapshot, pattern, type_filter, snapshot.unique_names())
+	return result
+#end
+
+def time_call(func, *args):
+	start = time.time()
+	count = len(func(*args))
+	return time.time() - start, count
+#end
+
+def bench_compare(sizes=(10000, 100000, 1000000)):
+	numpy_label = 'numpy (s)' if None != checkercore.np else 'numpy (n/a)'
+	print('%10s %12s %12s %12s %10s' % ('values', 'legacy (s)', 'python (s)', numpy_label, 'mismatches'))
+	for size in sizes:
+		values = make_values(size)
+		legacy, count = time_call(legacy_compare, values, 0.0)
+		python = time_call(lambda: checkercore.find_mismatches_python(values, 0.0, '==', True)[1])[0]
+		vectorized = '-'
+		if None != checkercore.np:
+			vectorized = '%.4f' % time_call(lambda: checkercore.find_mismatches_numpy(values, 0.0, '==', True)[1])[0]
+		print('%10d %12.4f %12.4f %12s %10d' % (size, legacy, python, vectorized, count))
+#end
+
+def bench_filter(sizes=(10000, 100000, 1000000)):
+	keystrokes = typing(r'L_arm_ctrl_0001')
+	type_filter = 'transform|joint'
+	print('%10s %12s %12s %10s' % ('names', 'legacy (s)', 'filter (s)', 'matches'))
+	for size in sizes:
+		snapshot = make_snapshot(size)
+		snapshot.unique_names() # built once per snapshot either way
+		legacy = time_call(legacy_typing, snapshot, keystrokes, type_filter)[0]
+		elapsed, count = time_call(filter_typing, snapshot, keystrokes, type_filter)
+		print('%10d %12.4f %12.4f %10d' % (size, legacy, elapsed, count))
+#end
+
+if __name__ == '__main__':
+	bench_compare()
+	print('')
+	bench_filter()
@@ -0,0 +1,96 @@
+#
+# Value Checker Batch
+# Daniel Green, 2019
+# GitHub: KasumiL5x
+#
+# Validates many scene files against a rule file without a UI, one mayapy worker process per core.
+# Each scene gets a JSON report of every rule's mismatches; the exit code is 1 if any scene failed,
+# so it can gate publishing.
+#
+#   mayapy checkerbatch.py --rules rig_rules.json rigs/*.ma
+#
+# sceneindex.py and stageprofiler.py must be importable; their folders next to this one are added to the path automatically.
+
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import multiprocessing
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(SCRIPT_DIR)
+sys.path.append(os.path.join(SCRIPT_DIR, '..', 'sceneindex'))
+sys.path.append(os.path.join(SCRIPT_DIR, '..', 'stageprofiler'))
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description='Validate attribute values in many Maya scenes against a rule file.')
+	parser.add_argument('scenes', nargs='+', help='.ma/.mb files to validate')
+	parser.add_argument('--rules', required=True, help='JSON rule file')
+	parser.add_argument('--report-dir', default=None, help='write reports here instead of next to each scene')
+	parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='number of worker processes')
+	return parser.parse_args(argv)
+#end
+
+def init_worker():
+	import maya.standalone
+	maya.standalone.initialize(name='python')
+#end
+
+def report_path(scene, report_dir):
+	base = os.path.splitext(os.path.basename(scene))[0] + '.validation.json'
+	return os.path.join(report_dir or os.path.dirname(os.path.abspath(scene)), base)
+#end
+
+# Validates a single scene, writing and returning its report.  Module-level for the pool.
+def process_scene(job):
+	scene, options = job
+	import maya.cmds as mc
+	import checkercore
+
+	report = {'scene': scene, 'errors': 0, 'rules': [], 'error': None}
+	start = time.time()
+	try:
+		rules = checkercore.load_rules(options['rules'])
+		mc.file(scene, open=True, force=True)
+		report['rules'] = checkercore.validate_scene(rules)
+		report['errors'] = sum(x['errors'] + len(x['problems']) for x in report['rules'])
+	except Exception:
+		report['error'] = traceback.format_exc()
+	report['seconds'] = time.time() - start
+
+	with open(report_path(scene, options['report_dir']), 'w') as f:
+		# default=str for any getAttr value JSON can't hold
+		json.dump(report, f, indent=2, default=str)
+	return report
+#end
+
+def main(argv=None):
+	args = parse_args(sys.argv[1:] if None == argv else argv)
+	options = {
+		'rules': os.path.abspath(args.rules),
+		'report_dir': args.report_dir
+	}
+	if None != args.report_dir and not os.path.isdir(args.report_dir):
+		os.makedirs(args.report_dir)
+
+	jobs = [(scene, options) for scene in args.scenes]
+	# each worker initializes Maya once and then opens its scenes one after another
+	pool = multiprocessing.Pool(max(1, min(args.processes, len(jobs))), init_worker)
+	try:
+		reports = pool.map(process_scene, jobs)
+	finally:
+		pool.close()
+		pool.join()
+
+	failed = 0
+	for report in reports:
+		if None != report['error'] or report['errors']:
+			failed += 1
+		print('%s: %d errors%s' % (report['scene'], report['errors'], ' (error)' if None != report['error'] else ''))
+	return 1 if failed else 0
+#end
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,750 @@
+#
+# Value Checker Core
+# Daniel Green, 2019
+# GitHub: KasumiL5x
+#
+# Attribute reading, comparison, and rule checking, free of any UI so that it can run
+# from the dialog or from mayapy (see checkerbatch.py).
+
+import re
+import json
+from array import array
+from collections import OrderedDict
+import maya.cmds as mc
+import maya.api.OpenMaya as om
+import sceneindex
+import stageprofiler
+try:
+	import numpy as np
+except ImportError:
+	np = None # falls back to pure python comparisons
+
+try:
+	basestring
+except NameError:
+	basestring = str # python 3
+
+# status of each node in an AttributeColumn
+NODE_MISSING = 0
+ATTRIB_MISSING = 1
+ATTRIB_FOUND = 2
+
+# Python type getAttr would return for a plug (bool, int, or float), or None if it isn't a plain number
+def plug_value_type(attr):
+	if attr.hasFn(om.MFn.kNumericAttribute):
+		numeric_type = om.MFnNumericAttribute(attr).numericType()
+		if om.MFnNumericData.kBoolean == numeric_type:
+			return bool
+		if numeric_type in [om.MFnNumericData.kByte, om.MFnNumericData.kChar, om.MFnNumericData.kShort, om.MFnNumericData.kInt, om.MFnNumericData.kInt64]:
+			return int
+		if numeric_type in [om.MFnNumericData.kFloat, om.MFnNumericData.kDouble]:
+			return float
+		return None
+	if attr.hasFn(om.MFn.kUnitAttribute):
+		return float
+	if attr.hasFn(om.MFn.kEnumAttribute):
+		return int
+	return None
+#end
+
+# plug's value as a float in the same (UI) units getAttr reports
+def plug_as_float(plug):
+	attr = plug.attribute()
+	if attr.hasFn(om.MFn.kUnitAttribute):
+		unit_type = om.MFnUnitAttribute(attr).unitType()
+		if om.MFnUnitAttribute.kAngle == unit_type:
+			return plug.asMAngle().asUnits(om.MAngle.uiUnit())
+		if om.MFnUnitAttribute.kDistance == unit_type:
+			return plug.asMDistance().asUnits(om.MDistance.uiUnit())
+		if om.MFnUnitAttribute.kTime == unit_type:
+			return plug.asMTime().asUnits(om.MTime.uiUnit())
+	return plug.asDouble()
+#end
+
+# One attribute read from many nodes, as flat columns.  For compounds like translate, values holds
+# the children back to back ([tx0, ty0, tz0, tx1, ...]) and component_names their short names.
+class AttributeColumn(object):
+	def __init__(self, nodes, attrib):
+		self.nodes = nodes
+		self.attrib = attrib
+		self.component_names = [attrib]
+		self.status = bytearray(len(nodes)) # NODE_MISSING/ATTRIB_MISSING/ATTRIB_FOUND per node
+		self.types = [None] * len(nodes) # bool/int/float per node (None if not a plain number)
+		self.values = array('d') # width values per node; 0.0 where missing or not a plain number
+		self.others = {} # node index => getAttr value, for attributes that aren't plain numbers
+	#end
+
+	def width(self):
+		return len(self.component_names)
+	#end
+
+	# Replaces the given rows with fresh, which holds the same attribute re-read from just those nodes.
+	# Returns False (changing nothing) if fresh's layout differs, e.g. the attribute became a compound.
+	def update_rows(self, rows, fresh):
+		width = self.width()
+		if fresh.width() != width and ATTRIB_FOUND in fresh.status:
+			return False
+		for pos, row in enumerate(rows):
+			self.status[row] = fresh.status[pos]
+			self.types[row] = fresh.types[pos]
+			self.others.pop(row, None)
+			if pos in fresh.others:
+				self.others[row] = fresh.others[pos]
+			if fresh.width() == width:
+				self.values[row*width:(row+1)*width] = fresh.values[pos*width:(pos+1)*width]
+			else:
+				self.values[row*width:(row+1)*width] = array('d', [0.0] * width)
+		return True
+	#end
+
+	# Python value of a node's component, as getAttr would have returned it
+	def value(self, idx, component=0):
+		if idx in self.others:
+			return self.others[idx]
+		value = self.values[idx * self.width() + component]
+		return self.types[idx](value) if None != self.types[idx] else value
+	#end
+#end
+
+# MFnDependencyNode of each node, or None where it doesn't exist (anymore)
+@stageprofiler.timed('checker.resolve')
+def resolve_nodes(nodes):
+	fns = []
+	for node in nodes:
+		sel = om.MSelectionList()
+		try:
+			sel.add(node)
+		except RuntimeError:
+			fns.append(None)
+			continue
+		fns.append(om.MFnDependencyNode(sel.getDependNode(0)))
+	return fns
+#end
+
+# Reads attrib (a scalar, or with allow_compound a compound of scalars such as translate) from every
+# node in one pass through the API instead of attributeQuery/objExists/getAttr round-trips per node.
+# fns (from resolve_nodes) saves looking the nodes up again when reading several attributes.
+@stageprofiler.timed('checker.fetch')
+def fetch_attribute(nodes, attrib, allow_compound=True, fns=None):
+	if None == fns:
+		fns = resolve_nodes(nodes)
+	column = AttributeColumn(nodes, attrib)
+	width = None
+
+	for idx, node in enumerate(nodes):
+		fn = fns[idx]
+		if None == fn:
+			column.values.extend([0.0] * (width or 1))
+			continue # node was deleted
+
+		if not fn.hasAttribute(attrib):
+			column.status[idx] = ATTRIB_MISSING
+			column.values.extend([0.0] * (width or 1))
+			continue
+		column.status[idx] = ATTRIB_FOUND
+		plug = fn.findPlug(attrib, False)
+
+		# the first node found decides the layout (all nodes with the attribute share it)
+		if None == width:
+			if plug.isCompound and allow_compound:
+				column.component_names = [om.MFnAttribute(plug.child(c).attribute()).shortName for c in range(plug.numChildren())]
+			width = len(column.component_names)
+			if width > 1:
+				# backfill the nodes before this one, which were single placeholder values
+				column.values = array('d', [0.0] * (idx * width))
+
+		# a later node can have an attribute of the same name laid out differently (a scalar, or fewer children)
+		value_type = None
+		if (width > 1) == plug.isCompound and not plug.isArray and (1 == width or plug.numChildren() == width):
+			children = [plug.child(c) for c in range(width)] if width > 1 else [plug]
+			value_type = plug_value_type(children[0].attribute())
+		if None == value_type:
+			# not a plain number (e.g. a string or matrix), so just ask getAttr like before
+			column.others[idx] = mc.getAttr(node + '.' + attrib)
+			column.values.extend([0.0] * width)
+			continue
+
+		column.types[idx] = value_type
+		for child in children:
+			if bool == value_type:
+				column.values.append(1.0 if child.asBool() else 0.0)
+			elif int == value_type:
+				column.values.append(child.asInt())
+			else:
+				column.values.append(plug_as_float(child))
+	#end
+
+	return column
+#end
+
+# floats closer than this are equal
+EPSILON = 0.000001
+COMPARISON_OPERATORS = ['==', '!=', '<', '<=', '>', '>=']
+
+# Compares values (array('d') or list of numbers) against expected with operator op, using EPSILON for
+# equality when use_epsilon is set.  Only the positions in indices are compared if given.  Returns
+# (mismatch_mask, mismatch_indices): the mask lines up with indices (or values), and the indices are
+# positions in values.  With bools set the values are bools stored as 0/1, which are either equal or
+# not: < and > always mismatch and <= and >= only check equality.
+def find_mismatches(values, expected, op, use_epsilon, indices=None, bools=False):
+	if op not in COMPARISON_OPERATORS:
+		raise ValueError('Unknown comparison: %s' % op)
+	if bools and op in ['<', '>']:
+		positions = list(range(len(values)) if None == indices else indices)
+		return (bytearray([1] * len(positions)), positions)
+	if bools and op in ['<=', '>=']:
+		op = '=='
+	if None != np:
+		return find_mismatches_numpy(values, expected, op, use_epsilon, indices)
+	return find_mismatches_python(values, expected, op, use_epsilon, indices)
+#end
+
+def find_mismatches_numpy(values, expected, op, use_epsilon, indices=None):
+	a = np.frombuffer(values, dtype=np.float64) if isinstance(values, array) else np.asarray(values, dtype=np.float64)
+	index_array = None
+	if None != indices:
+		index_array = np.asarray(indices, dtype=np.intp)
+		a = a[index_array]
+
+	if op in ['==', '!=', '<=', '>='] and use_epsilon:
+		equal = np.abs(a - expected) < EPSILON
+	if '==' == op:
+		passed = equal if use_epsilon else (a == expected)
+	elif '!=' == op:
+		passed = ~equal if use_epsilon else (a != expected)
+	elif '<' == op:
+		passed = a < expected
+	elif '<=' == op:
+		passed = ((a < expected) | equal) if use_epsilon else (a <= expected)
+	elif '>' == op:
+		passed = a > expected
+	else:
+		passed = ((a > expected) | equal) if use_epsilon else (a >= expected)
+
+	mask = ~passed
+	positions = np.flatnonzero(mask)
+	if None != indices:
+		positions = index_array[positions]
+	return (mask, positions.tolist())
+#end
+
+def find_mismatches_python(values, expected, op, use_epsilon, indices=None):
+	if use_epsilon:
+		equal = lambda a: abs(expected - a) < EPSILON
+	else:
+		equal = lambda a: a == expected
+	passed = {
+		'==': equal,
+		'!=': lambda a: not equal(a),
+		'<': lambda a: a < expected,
+		'<=': lambda a: a < expected or equal(a),
+		'>': lambda a: a > expected,
+		'>=': lambda a: a > expected or equal(a)
+	}[op]
+
+	positions = range(len(values)) if None == indices else indices
+	mask = bytearray(0 if passed(values[idx]) else 1 for idx in positions)
+	return (mask, [idx for idx, failed in zip(positions, mask) if failed])
+#end
+
+# text as a value_type (bool/int/float), or None if it isn't one
+def parse_value(text, value_type):
+	if bool == value_type:
+		return text.lower() in ['true', 't', 'yes', 'y', '1']
+	try:
+		return value_type(text)
+	except ValueError:
+		return None
+#end
+
+# kinds of ResultLog record
+LOG_STATUS = 0 # progress lines (Checking.../Done), always kept
+LOG_ERROR = 1 # per-node problem (attribute not found, bad value)
+LOG_MISMATCH = 2 # per-node value that failed a check
+
+# results kept in memory (and shown) per validation; the rest spill to a file if one is given
+MAX_LOG_RECORDS = 5000
+# lines handed to the view at a time
+LOG_FLUSH_SIZE = 500
+
+# node a record is about (None for status lines and general errors)
+def record_node(record):
+	if LOG_MISMATCH == record[0]:
+		return record[1]
+	if LOG_ERROR == record[0]:
+		return record[2]
+	return None
+#end
+
+def format_record(record):
+	if LOG_MISMATCH == record[0]:
+		node, attrib, operator, expected, actual = record[1:]
+		return '%s.%s should be %s %s but is %s.' % (node, attrib, operator, expected, actual)
+	return record[1]
+#end
+
+# Collects structured validation results and hands them to a sink (e.g. the output box) in batches,
+# so a validation with many mismatches doesn't redraw the view once per line.  Only the first cap
+# error/mismatch records are kept (all of them if cap is None); the rest are appended to spill_path,
+# or just counted if it's None.
+class ResultLog(object):
+	def __init__(self, sink=None, cap=MAX_LOG_RECORDS, spill_path=None):
+		self.sink = sink # called with a list of lines
+		self.cap = cap
+		self.spill_path = spill_path
+		self.spill_file = None
+		self.records = [] # (LOG_STATUS, msg), (LOG_ERROR, msg, node), or (LOG_MISMATCH, node, attrib, operator, expected, actual)
+		self.capped_count = 0 # error/mismatch records kept in records
+		self.overflow_count = 0 # error/mismatch records past the cap
+		self.pending = []
+	#end
+
+	def status(self, msg):
+		self.add((LOG_STATUS, msg))
+	#end
+
+	def error(self, msg, node=None):
+		self.add((LOG_ERROR, msg, node))
+	#end
+
+	def mismatch(self, node, attrib, operator, expected, actual):
+		self.add((LOG_MISMATCH, node, attrib, operator, expected, actual))
+	#end
+
+	def add(self, record):
+		if LOG_STATUS != record[0]:
+			if None != self.cap and self.capped_count >= self.cap:
+				self._spill(record)
+				return
+			self.capped_count += 1
+		self.records.append(record)
+		self.pending.append(format_record(record))
+		if len(self.pending) >= LOG_FLUSH_SIZE:
+			self.flush()
+	#end
+
+	def _spill(self, record):
+		self.overflow_count += 1
+		if None == self.spill_path:
+			return
+		if None == self.spill_file:
+			self.spill_file = open(self.spill_path, 'w')
+		self.spill_file.write(format_record(record) + '\n')
+	#end
+
+	def flush(self):
+		if len(self.pending) and None != self.sink:
+			self.sink(self.pending)
+		self.pending = []
+	#end
+
+	# flushes everything, noting how many results didn't fit, and closes the spill file
+	def close(self):
+		if self.overflow_count:
+			if None != self.spill_file:
+				# so the file still has every result past the cap when the summary is read
+				self.spill_file.close()
+				self.spill_file = None
+				self.status('%d more results written to %s.' % (self.overflow_count, self.spill_path))
+			else:
+				self.status('%d more results not shown.' % self.overflow_count)
+		self.flush()
+	#end
+#end
+
+
+# One check: attribute (scalar or compound) compared with operator against value, on the nodes whose
+# name and type match the patterns.  value is text, parsed for each node's value type like the UI does.
+class Rule(object):
+	def __init__(self, attribute, operator='==', value='0', name_pattern='', type_pattern='', skip_missing=False, description=None):
+		self.attribute = attribute
+		self.operator = operator
+		self.value = value if isinstance(value, basestring) else str(value)
+		self.name_pattern = name_pattern
+		self.type_pattern = type_pattern
+		self.skip_missing = skip_missing # nodes without the attribute are ignored rather than reported
+		self.description = description or '%s %s %s' % (attribute, operator, self.value)
+	#end
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(data['attribute'], data.get('operator', '=='), data.get('value', '0'), data.get('name', ''), data.get('type', ''), data.get('skip_missing', False), data.get('description', None))
+	#end
+
+	def to_dict(self):
+		return {
+			'attribute': self.attribute,
+			'operator': self.operator,
+			'value': self.value,
+			'name': self.name_pattern,
+			'type': self.type_pattern,
+			'skip_missing': self.skip_missing,
+			'description': self.description
+		}
+	#end
+#end
+
+# the dialog's checkboxes, as rules
+ZERO_TRANSLATION_RULE = Rule('translate', '==', '0', skip_missing=True, description='translations')
+ZERO_ROTATION_RULE = Rule('rotate', '==', '0', skip_missing=True, description='rotations')
+UNIT_SCALE_RULE = Rule('scale', '==', '1', skip_missing=True, description='scales')
+
+# Rules from a JSON file, either a list of rules or {"rules": [...]}, each like
+# {"name": "_CTRL$", "type": "transform", "attribute": "translate", "operator": "==", "value": 0}.
+# Raises ValueError for rules with unknown operators or invalid patterns.
+def load_rules(path):
+	with open(path, 'r') as f:
+		data = json.load(f)
+	if isinstance(data, dict):
+		data = data.get('rules', [])
+
+	rules = []
+	for idx, entry in enumerate(data):
+		if 'attribute' not in entry:
+			raise ValueError('Rule %d has no attribute.' % idx)
+		rule = Rule.from_dict(entry)
+		if rule.operator not in COMPARISON_OPERATORS:
+			raise ValueError('Rule %d has an unknown comparison: %s' % (idx, rule.operator))
+		for pattern in [rule.name_pattern, rule.type_pattern]:
+			try:
+				re.compile(pattern)
+			except re.error:
+				raise ValueError('Rule %d has an invalid pattern: %s' % (idx, pattern))
+		rules.append(rule)
+	return rules
+#end
+
+# Compares an already fetched column (only the given rows of it, if any) against rule, logging
+# problems and mismatches in node order.  Returns the number of mismatches.
+@stageprofiler.timed('checker.compare')
+def check_column(rule, column, log, rows=None):
+	if rule.operator not in COMPARISON_OPERATORS:
+		log.error('An invalid comparison was selected.')
+		return 0
+
+	# compare every component of all nodes of each value type in one go (None if the value doesn't suit the type)
+	width = column.width()
+	rows = range(len(column.nodes)) if None == rows else rows
+	expected_by_type = dict((x, parse_value(rule.value, x)) for x in [bool, int, float])
+	mismatches = set()
+	for value_type, expected in expected_by_type.items():
+		indices = [idx * width + c for idx in rows if column.types[idx] == value_type for c in range(width)]
+		if None == expected or not len(indices):
+			continue
+		mismatches.update(find_mismatches(column.values, expected, rule.operator, float == value_type, indices, bool == value_type)[1])
+
+	error_count = 0
+	for idx in rows:
+		node = column.nodes[idx]
+		# object could be deleted
+		if NODE_MISSING == column.status[idx]:
+			continue
+
+		# attribute may not exist
+		if ATTRIB_MISSING == column.status[idx]:
+			if not rule.skip_missing:
+				log.error('Attribute not found: %s.%s.' % (node, rule.attribute), node)
+			continue
+
+		value_type = column.types[idx]
+		if int == value_type and None == expected_by_type[int]:
+			log.error('%s is an int; your value should be too.' % (node + '.' + rule.attribute), node)
+			continue
+		if float == value_type and None == expected_by_type[float]:
+			log.error('%s is a float; your value should be too.' % (node + '.' + rule.attribute), node)
+			continue
+
+		# values that aren't plain numbers never match
+		if None == value_type:
+			log.mismatch(node, rule.attribute, rule.operator, rule.value, column.value(idx))
+			error_count += 1
+			continue
+
+		# mini-hack: show the parsed bool to show True/False instead of 0/1/t/f/etc.
+		shown_expected = expected_by_type[bool] if bool == value_type else rule.value
+		for c, component in enumerate(column.component_names):
+			if idx * width + c in mismatches:
+				log.mismatch(node, component, rule.operator, shown_expected, column.value(idx, c))
+				error_count += 1
+	#end
+
+	return error_count
+#end
+
+def check_rule(rule, nodes, log):
+	return check_column(rule, fetch_attribute(nodes, rule.attribute), log)
+#end
+
+# Groups rules by the attribute they read so that validating many rules looks each node up once and
+# reads each attribute once per node, however many rules use it.  rule_rows gives, per rule, the
+# indices into nodes it applies to (None for all of them).
+class ValidationPlan(object):
+	def __init__(self, nodes, rules, rule_rows=None):
+		self.nodes = nodes
+		self.rules = rules
+		self.rule_rows = list(rule_rows) if None != rule_rows else [None] * len(rules)
+		# attribute => set of node indices any rule reads it from (None for all nodes)
+		self.attribute_rows = OrderedDict()
+		for rule, rows in zip(self.rules, self.rule_rows):
+			if None == rows or None == self.attribute_rows.get(rule.attribute, set()):
+				self.attribute_rows[rule.attribute] = None
+			else:
+				self.attribute_rows.setdefault(rule.attribute, set()).update(rows)
+		# attribute => (column, {node index => row in column}) once fetched
+		self.columns = {}
+	#end
+
+	def fetch(self):
+		needed = set()
+		for rows in self.attribute_rows.values():
+			needed = set(range(len(self.nodes))) if None == rows else needed | rows
+		fns = {}
+		for idx, fn in zip(sorted(needed), resolve_nodes([self.nodes[x] for x in sorted(needed)])):
+			fns[idx] = fn
+
+		self.columns = {}
+		for attrib, rows in self.attribute_rows.items():
+			rows = range(len(self.nodes)) if None == rows else sorted(rows)
+			column = fetch_attribute([self.nodes[x] for x in rows], attrib, fns=[fns[x] for x in rows])
+			self.columns[attrib] = (column, dict((x, pos) for pos, x in enumerate(rows)))
+	#end
+
+	# checks rule number idx against its column (fetching every column first if need be)
+	def check(self, idx, log):
+		if not len(self.columns):
+			self.fetch()
+		rule = self.rules[idx]
+		column, positions = self.columns[rule.attribute]
+		rows = self.rule_rows[idx]
+		rows = None if None == rows else [positions[x] for x in rows]
+		return check_column(rule, column, log, rows)
+	#end
+#end
+
+# Keeps the last validation of nodes against rules, and watches those nodes with attribute-changed,
+# plug-dirtied, renamed, and deleted callbacks, so that validating again only re-reads and re-compares
+# the nodes where one of the rules' attributes changed (directly or through a connection).  Results of
+# the other nodes are reused and everything is logged in node order, as a full validation would.
+class IncrementalValidation(object):
+	def __init__(self, nodes, rules):
+		self.nodes = list(nodes)
+		self.rules = rules
+		self.rule_dicts = [x.to_dict() for x in rules]
+		self.plan = ValidationPlan(self.nodes, rules)
+		self.attributes = set(x.attribute for x in rules) # as named in the rules (long or short)
+		# per rule, node (None for general errors) => its records from the last validation; None when there
+		# were more than a log keeps in memory, in which case every node is compared again each time
+		self.records = None
+		self.dirty = None # node indices to recheck; None until the first (full) validation
+		self.callback_ids = []
+	#end
+
+	def matches(self, nodes, rules):
+		return list(nodes) == self.nodes and [x.to_dict() for x in rules] == self.rule_dicts
+	#end
+
+	def run(self, log):
+		if None == self.dirty:
+			self.plan.fetch()
+			self.records = None
+			self.install_callbacks()
+		else:
+			rows = sorted(self.dirty)
+			if len(rows) and not self.refresh(rows):
+				self.records = None
+			if None != self.records and not self.update_records(rows):
+				self.records = None
+
+		if None == self.records:
+			self.check_all(log)
+		else:
+			self.replay(log)
+
+		# nodes that don't exist (anymore) are looked for again every time, in case they come back (e.g. undo)
+		self.dirty = set()
+		for column, positions in self.plan.columns.values():
+			self.dirty = set(x for x in range(len(self.nodes)) if NODE_MISSING == column.status[x])
+			break # every column has the same missing nodes
+	#end
+
+	# Compares every node against every rule straight into log, like a full validation, keeping the
+	# results for next time only if none of them went past log's cap.
+	def check_all(self, log):
+		overflow_count = log.overflow_count
+		records = []
+		kept_count = 0
+		for rule in self.rules:
+			log.status('Checking %s...' % rule.description)
+			start = len(log.records)
+			error_count = check_column(rule, self.plan.columns[rule.attribute][0], log)
+			results = {}
+			for record in log.records[start:]:
+				results.setdefault(record_node(record), []).append(record)
+			kept_count += len(log.records) - start
+			records.append(results)
+			log.status('Done (%s errors).\n' % error_count)
+		self.records = records if overflow_count == log.overflow_count and kept_count <= MAX_LOG_RECORDS else None
+	#end
+
+	# Compares the rows again, replacing their kept results.  False if all results would no longer fit
+	# within MAX_LOG_RECORDS, leaving the kept results incomplete.
+	def update_records(self, rows):
+		kept_count = 0
+		for idx, rule in enumerate(self.rules):
+			fresh = ResultLog()
+			check_column(rule, self.plan.columns[rule.attribute][0], fresh, rows)
+			if fresh.overflow_count:
+				return False
+			results = self.records[idx]
+			results.pop(None, None)
+			for row in rows:
+				results.pop(self.nodes[row], None)
+			for record in fresh.records:
+				results.setdefault(record_node(record), []).append(record)
+			kept_count += sum(len(x) for x in results.values())
+		return kept_count <= MAX_LOG_RECORDS
+	#end
+
+	# logs the kept results in node order
+	def replay(self, log):
+		for rule, results in zip(self.rules, self.records):
+			log.status('Checking %s...' % rule.description)
+			for record in results.get(None, []):
+				log.add(record)
+			error_count = 0
+			for node in self.nodes:
+				for record in results.get(node, []):
+					log.add(record)
+					if LOG_MISMATCH == record[0]:
+						error_count += 1
+			log.status('Done (%s errors).\n' % error_count)
+	#end
+
+	# re-reads the dirty rows of every column; False if a column's layout changed and all needs re-reading
+	def refresh(self, rows):
+		names = [self.nodes[x] for x in rows]
+		fns = resolve_nodes(names)
+		for attrib, (column, positions) in self.plan.columns.items():
+			if not column.update_rows(rows, fetch_attribute(names, attrib, fns=fns)):
+				self.plan.fetch()
+				return False
+		return True
+	#end
+
+	def install_callbacks(self):
+		self.remove_callbacks()
+		for idx, fn in enumerate(resolve_nodes(self.nodes)):
+			if None == fn:
+				continue
+			obj = fn.object()
+			self.callback_ids.append(om.MNodeMessage.addAttributeChangedCallback(obj, self._on_attribute_changed, idx))
+			self.callback_ids.append(om.MNodeMessage.addNameChangedCallback(obj, self._on_name_changed, idx))
+			self.callback_ids.append(om.MNodeMessage.addNodePreRemovalCallback(obj, self._on_node_removed, idx))
+			self.callback_ids.append(om.MNodeMessage.addNodeDirtyPlugCallback(obj, self._on_plug_dirty, idx))
+		# animated or driven values change with time without any attribute being set
+		self.callback_ids.append(om.MEventMessage.addEventCallback('timeChanged', self._on_time_changed))
+		# a new or opened scene may have nodes of the same names, but none of the ones being watched
+		self.callback_ids.append(om.MSceneMessage.addCallback(om.MSceneMessage.kAfterNew, self._on_scene_changed))
+		self.callback_ids.append(om.MSceneMessage.addCallback(om.MSceneMessage.kAfterOpen, self._on_scene_changed))
+	#end
+
+	def remove_callbacks(self):
+		if len(self.callback_ids):
+			om.MMessage.removeCallbacks(self.callback_ids)
+		self.callback_ids = []
+	#end
+
+	# True if plug is (part of) one of the rules' attributes
+	def affects_rules(self, plug):
+		# translateX counts as a change of translate, and setting translate as a whole as a change of translateX
+		plugs = [plug]
+		if plug.isChild:
+			plugs.append(plug.parent())
+		if plug.isCompound:
+			plugs.extend(plug.child(x) for x in range(plug.numChildren()))
+		names = set()
+		for curr in plugs:
+			attr = om.MFnAttribute(curr.attribute())
+			names.update([attr.name, attr.shortName])
+		return len(names & self.attributes) > 0
+	#end
+
+	def _on_attribute_changed(self, msg, plug, other_plug, client_data):
+		if None == self.dirty or client_data in self.dirty:
+			return
+		if self.affects_rules(plug):
+			self.dirty.add(client_data)
+	#end
+
+	# values driven through connections (constraints, driven keys, expressions) are dirtied when their
+	# driver changes, without anything being set on the node itself
+	def _on_plug_dirty(self, node, plug, client_data):
+		if None == self.dirty or client_data in self.dirty:
+			return
+		if self.affects_rules(plug):
+			self.dirty.add(client_data)
+	#end
+
+	def _on_name_changed(self, node, prev_name, client_data):
+		if None != self.dirty:
+			self.dirty.add(client_data)
+	#end
+
+	def _on_time_changed(self, client_data):
+		if None != self.dirty:
+			self.dirty.update(range(len(self.nodes)))
+	#end
+
+	# the refresh then finds the node missing and drops its results
+	def _on_node_removed(self, node, client_data):
+		if None != self.dirty:
+			self.dirty.add(client_data)
+	#end
+
+	# validates everything again next time, watching whatever nodes have the names then
+	def _on_scene_changed(self, client_data):
+		self.dirty = None
+	#end
+#end
+
+# names of the snapshot's nodes that rule applies to (short names where unique, like the UI lists them)
+def select_nodes(snapshot, rule):
+	names = snapshot.unique_names()
+	return [names[idx] for idx in sceneindex.iter_filtered(snapshot, rule.name_pattern, rule.type_pattern, names)]
+#end
+
+# record as a JSON-friendly dictionary
+def record_to_dict(record):
+	if LOG_MISMATCH == record[0]:
+		node, attrib, operator, expected, actual = record[1:]
+		return {'node': node, 'attribute': attrib, 'operator': operator, 'expected': expected, 'actual': actual}
+	return {'message': record[1]}
+#end
+
+# Checks every rule against the scene, listing its nodes once and reading each attribute once per node.
+# Returns a report per rule: the rule, its mismatch count, the mismatches, and any other problems.
+def validate_scene(rules, snapshot=None):
+	if None == snapshot:
+		with stageprofiler.stage('checker.ls'):
+			snapshot = sceneindex.SceneSnapshot.from_ls()
+
+	names = snapshot.unique_names()
+	with stageprofiler.stage('checker.filter'):
+		rule_indices = [list(sceneindex.iter_filtered(snapshot, x.name_pattern, x.type_pattern, names)) for x in rules]
+	used = sorted(set(idx for indices in rule_indices for idx in indices))
+	row_of = dict((x, row) for row, x in enumerate(used))
+	plan = ValidationPlan([names[x] for x in used], rules, [[row_of[x] for x in indices] for indices in rule_indices])
+
+	reports = []
+	for idx, rule in enumerate(rules):
+		log = ResultLog(cap=None)
+		error_count = plan.check(idx, log)
+		log.close()
+		reports.append({
+			'rule': rule.to_dict(),
+			'errors': error_count,
+			'mismatches': [record_to_dict(x) for x in log.records if LOG_MISMATCH == x[0]],
+			'problems': [record_to_dict(x) for x in log.records if LOG_ERROR == x[0]]
+		})
+	return reports
+#end
@@ -2,13 +2,132 @@ import PySide2.QtCore as QtCore
 import PySide2.QtGui as QtGui
 import PySide2.QtWidgets as QtWidgets
 import maya.cmds as mc
-import re
+import maya.api.OpenMaya as om
+import os
+import sceneindex
+import stageprofiler
+import checkercore
 
 g_dialog = None
 
+# Scalar attribute names (as listAttr -s lists them) of many nodes.  Nodes of the same type share
+# their static attributes, so those are listed once per type; user-defined attributes are listed
+# once per node and forgotten when that node gains or loses an attribute, is renamed, or is deleted.
+class AttributeIndex(object):
+	def __init__(self):
+		self.type_attribs = {} # node type => frozenset of static scalar attributes
+		self.dynamic_attribs = {} # node name => frozenset of its user-defined scalar attributes
+		self.callback_ids = {} # node name => callbacks that invalidate its dynamic_attribs entry
+	#end
+
+	def union(self, nodes, types):
+		result = set()
+		types_done = set()
+		for node, node_type in zip(nodes, types):
+			dynamic = self.dynamic_of(node)
+			if None == dynamic:
+				continue # node was deleted
+			result |= dynamic
+			if node_type in types_done:
+				continue
+			if node_type not in self.type_attribs:
+				# any node can describe its type; user-defined attributes are per node, so left out
+				self.type_attribs[node_type] = frozenset(set(mc.listAttr(node, s=True) or []) - dynamic)
+			result |= self.type_attribs[node_type]
+			types_done.add(node_type)
+		return result
+	#end
+
+	# user-defined scalar attributes of node, or None if it doesn't exist
+	def dynamic_of(self, node):
+		try:
+			return self.dynamic_attribs[node]
+		except KeyError:
+			pass
+
+		sel = om.MSelectionList()
+		try:
+			sel.add(node)
+		except RuntimeError:
+			return None
+		obj = sel.getDependNode(0)
+		attribs = frozenset(mc.listAttr(node, ud=True, s=True) or [])
+		self.dynamic_attribs[node] = attribs
+		self.callback_ids[node] = [
+			om.MNodeMessage.addAttributeAddedOrRemovedCallback(obj, self._on_attribute_added_or_removed, node),
+			om.MNodeMessage.addNameChangedCallback(obj, self._on_name_changed, node),
+			om.MNodeMessage.addNodePreRemovalCallback(obj, self._on_node_removed, node)
+		]
+		return attribs
+	#end
+
+	def forget(self, node):
+		self.dynamic_attribs.pop(node, None)
+		ids = self.callback_ids.pop(node, None)
+		if None != ids:
+			om.MMessage.removeCallbacks(ids)
+	#end
+
+	def clear(self):
+		for ids in self.callback_ids.values():
+			om.MMessage.removeCallbacks(ids)
+		self.type_attribs = {}
+		self.dynamic_attribs = {}
+		self.callback_ids = {}
+	#end
+
+	def _on_attribute_added_or_removed(self, msg, plug, client_data):
+		self.forget(client_data)
+	#end
+
+	def _on_name_changed(self, node, prev_name, client_data):
+		self.forget(client_data)
+	#end
+
+	def _on_node_removed(self, node, client_data):
+		self.forget(client_data)
+	#end
+#end
+
+# Read-only list of node names.  Qt only asks for the visible rows, so a refresh is one model reset.
+class NodeListModel(QtCore.QAbstractListModel):
+	def __init__(self, parent=None):
+		QtCore.QAbstractListModel.__init__(self, parent)
+		self.names = []
+	#end
+
+	def set_names(self, names):
+		self.beginResetModel()
+		self.names = names
+		self.endResetModel()
+	#end
+
+	def rowCount(self, parent=QtCore.QModelIndex()):
+		if parent.isValid():
+			return 0
+		return len(self.names)
+	#end
+
+	def data(self, index, role=QtCore.Qt.DisplayRole):
+		if index.isValid() and QtCore.Qt.DisplayRole == role:
+			return self.names[index.row()]
+		return None
+	#end
+#end
+
 class ValueChecker(QtWidgets.QDialog):
 	def __init__(self):
 		QtWidgets.QDialog.__init__(self)
+
+		# shared cache of the scene's nodes, kept current by callbacks
+		self.scene_index = sceneindex.acquire()
+		# attributes per node type (and per node for user-defined ones) for the attribute combobox
+		self.attrib_index = AttributeIndex()
+		# last name/type filter result, narrowed as the patterns are typed
+		self.node_filter = sceneindex.NodeFilter()
+		# types of the nodes in pattern_model
+		self.pattern_types = []
+
 		self.setWindowFlags(QtCore.Qt.WindowStaysOnTopHint)
 		self.setWindowTitle('Value Checker')
 		self.setFixedHeight(400)
@@ -43,7 +162,10 @@ class ValueChecker(QtWidgets.QDialog):
 		self.pattern_type_tb.setPlaceholderText('Filter by type (e.g. transform)...')
 		pattern_tb_widget.layout().addWidget(self.pattern_type_tb)
 		# pattern preview
-		self.pattern_lb = QtWidgets.QListWidget()
+		self.pattern_model = NodeListModel(self)
+		self.pattern_lb = QtWidgets.QListView()
+		self.pattern_lb.setUniformItemSizes(True)
+		self.pattern_lb.setModel(self.pattern_model)
 		self.pattern_lb.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
 		pattern_gb.layout().addWidget(self.pattern_lb)
 
@@ -62,10 +184,16 @@ class ValueChecker(QtWidgets.QDialog):
 		validation_attribs_widget.layout().setContentsMargins(0, 0, 0, 0)
 		validation_attribs_widget.layout().setSpacing(5)
 		validation_gb.layout().addWidget(validation_attribs_widget)
-		# attribute combobox
+		# attribute combobox (items come from a model, so refreshing it is one reset; typing completes from it)
+		self.attribs_model = QtCore.QStringListModel(self)
 		self.validation_attribs_combobox = QtWidgets.QComboBox()
 		self.validation_attribs_combobox.setFixedWidth(150)
 		self.validation_attribs_combobox.setEditable(True)
+		self.validation_attribs_combobox.setModel(self.attribs_model)
+		attribs_completer = QtWidgets.QCompleter(self.attribs_model, self.validation_attribs_combobox)
+		attribs_completer.setCaseSensitivity(QtCore.Qt.CaseInsensitive)
+		attribs_completer.setFilterMode(QtCore.Qt.MatchContains)
+		self.validation_attribs_combobox.setCompleter(attribs_completer)
 		validation_attribs_widget.layout().addWidget(self.validation_attribs_combobox)
 		# should be combobox
 		self.validation_attribs_shouldbe = QtWidgets.QComboBox()
@@ -111,12 +239,16 @@ class ValueChecker(QtWidgets.QDialog):
 
 		# output box
 		#
-		self.output_tb = QtWidgets.QTextEdit()
+		# plain text appends without re-laying out what's already there
+		self.output_tb = QtWidgets.QPlainTextEdit()
 		self.output_tb.setFixedHeight(120)
 		self.output_tb.setReadOnly(True)
 		self.output_tb.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse | QtCore.Qt.TextSelectableByKeyboard)
 		self.output_tb.setWordWrapMode(QtGui.QTextOption.NoWrap)
 		self.layout().addWidget(self.output_tb)
+		# results of the last validation
+		self.log = checkercore.ResultLog(self.append_output)
+		self.validation = None
 
 		# version lbl
 		#
@@ -129,262 +261,76 @@ class ValueChecker(QtWidgets.QDialog):
 		# connections
 		self.pattern_name_tb.textChanged.connect(self.on_pattern_name_changed)
 		self.pattern_type_tb.textChanged.connect(self.on_pattern_type_changed)
-		self.pattern_lb.itemSelectionChanged.connect(self.update_attribs_combobox)
+		self.pattern_lb.selectionModel().selectionChanged.connect(self.update_attribs_combobox)
 		self.validate_btn.clicked.connect(self.on_validate_clicked)
+		# the close button, Esc, and reject() all end in done(), which emits finished (closeEvent misses Esc)
+		self.released = False
+		self.finished.connect(self.on_finished)
 
 		# initially populate the list
 		self.update_filtered_objects(self.pattern_name_tb.text(), self.pattern_type_tb.text())
 	#end
 
-	def output_error(self, msg):
-		self.output_tb.setText(self.output_tb.toPlainText() + msg + '\n')
-		# self.output_tb.verticalScrollBar().setValue(self.output_tb.verticalScrollBar().maximum())
+	def on_finished(self, result):
+		if not self.released:
+			sceneindex.release()
+			self.released = True
+		self.attrib_index.clear()
+		self.clear_validation()
+	#end
+
+	def clear_validation(self):
+		if None != self.validation:
+			self.validation.remove_callbacks()
+		self.validation = None
 	#end
 
-	def output_mismatch_value(self, node, attrib, operator, expected, actual):
-		msg = '%s.%s should be %s %s but is %s.' % (node, attrib, operator, expected, actual)
-		self.output_tb.setText(self.output_tb.toPlainText() + msg + '\n')
+	def append_output(self, lines):
+		# one append per batch rather than per line
+		with stageprofiler.stage('checker.view'):
+			self.output_tb.appendPlainText('\n'.join(lines))
 	#end
 
 	def on_validate_clicked(self):
 		self.output_tb.clear()
+		# anything past the cap goes to a file in maya's temp folder
+		self.log = checkercore.ResultLog(self.append_output, spill_path=os.path.join(mc.internalVar(userTmpDir=True), 'valuechecker_results.txt'))
+		try:
+			self.validate()
+		finally:
+			self.log.close()
+	#end
 
+	def validate(self):
 		objects = self.get_filtered_objects()
 		if not len(objects):
 			return
 
-		# check translate
+		# validating the same objects with the same checks again only rechecks objects that changed since
+		rules = self.get_rules()
+		if not len(rules):
+			return
+		if None == self.validation or not self.validation.matches(objects, rules):
+			self.clear_validation()
+			self.validation = checkercore.IncrementalValidation(objects, rules)
+		self.validation.run(self.log)
+	#end
+
+	# the checked checkboxes and the custom attribute (if both it and its value are given) as rules
+	def get_rules(self):
+		rules = []
 		if self.validation_chk_translate.isChecked():
-			self.output_error('Checking translations...')
-			error_count = 0
-			for curr_obj in objects:
-				if not mc.attributeQuery('translate', node=curr_obj, ex=True):
-					continue
-				for c in ['tx', 'ty', 'tz']:
-					value = mc.getAttr(curr_obj + '.' + c)
-					if not self.are_equal(0.0, value):
-						self.output_mismatch_value(curr_obj, c, '', 0.0, value)
-						error_count += 1
-			self.output_error('Done (%s errors).\n' % error_count)
-		#end
-
-		# check rotate
+			rules.append(checkercore.ZERO_TRANSLATION_RULE)
 		if self.validation_chk_rotate.isChecked():
-			self.output_error('Checking rotations...')
-			error_count = 0
-			for curr_obj in objects:
-				if not mc.attributeQuery('rotate', node=curr_obj, ex=True):
-					continue
-				for c in ['rx', 'ry', 'rz']:
-					value = mc.getAttr(curr_obj + '.' + c)
-					if not self.are_equal(0.0, value):
-						self.output_mismatch_value(curr_obj, c, '', 0.0, value)
-						error_count += 1
-			self.output_error('Done (%s errors).\n' % error_count)
-		#end
-
-		# check scale
+			rules.append(checkercore.ZERO_ROTATION_RULE)
 		if self.validation_chk_scale.isChecked():
-			self.output_error('Checking scales...')
-			error_count = 0
-			for curr_obj in objects:
-				if not mc.attributeQuery('scale', node=curr_obj, ex=True):
-					continue
-				for c in ['sx', 'sy', 'sz']:
-					value = mc.getAttr(curr_obj + '.' + c)
-					if not self.are_equal(1.0, value):
-						self.output_mismatch_value(curr_obj, c, '', 1.0, value)
-						error_count += 1
-			self.output_error('Done (%s errors).\n' % error_count)
-		#end
-
-		# get current attribute from the GUI
-		attrib = self.get_current_attrib()
-		if not len(attrib):
-			return
+			rules.append(checkercore.UNIT_SCALE_RULE)
 
-		# get user-provided expected value
+		attrib = self.get_current_attrib()
 		expected_value = self.validation_attribs_value.text()
-		if not len(expected_value):
-			return
-
-		self.output_error('Checking custom attributes...')
-		error_count = 0
-
-		# which operation are we doing?
-		compare_func = None
-		if self.validation_attribs_shouldbe.currentText() == '==':
-			compare_func = self.are_equal
-		elif self.validation_attribs_shouldbe.currentText() == '!=':
-			compare_func = self.are_not_equal
-		elif self.validation_attribs_shouldbe.currentText() == '<':
-			compare_func = self.is_less
-		elif self.validation_attribs_shouldbe.currentText() == '<=':
-			compare_func = self.is_lequal
-		elif self.validation_attribs_shouldbe.currentText() == '>':
-			compare_func = self.is_greater
-		elif self.validation_attribs_shouldbe.currentText() == '>=':
-			compare_func = self.is_grequal
-		else:
-			self.output_error('An invalid comparison was selected.')
-			return
-
-		for curr_obj in objects:
-			# object could be deleted
-			if not mc.objExists(curr_obj):
-				continue
-
-			# attribute may not exist
-			if not mc.attributeQuery(attrib, node=curr_obj, ex=True):
-				self.output_error('Attribute not found: %s.%s.' % (curr_obj, attrib))
-				continue
-			
-			# raw attribute value from maya
-			attrib_value = mc.getAttr(curr_obj + '.' + attrib)
-
-			comparison_succeeded = False
-			if isinstance(attrib_value, bool): # MUST check bool before int because True/False passes isinstance(x, int) too.
-				comparison_succeeded = compare_func(attrib_value, self.string_to_bool(expected_value))
-			elif isinstance(attrib_value, int):
-				try:
-					expected_value_int = int(expected_value)
-					comparison_succeeded = compare_func(attrib_value, expected_value_int)
-				except:
-					self.output_error('%s is an int; your value should be too.' % (curr_obj + '.' + attrib))
-					continue
-			elif isinstance(attrib_value, float):
-				try:
-					expected_value_float = float(expected_value)
-					comparison_succeeded = compare_func(attrib_value, expected_value_float)
-				except Exception as ex:
-					print ex.message
-					self.output_error('%s is a float; your value should be too.' % (curr_obj + '.' + attrib))
-					continue
-
-
-			# output mismatch notifications
-			if not comparison_succeeded:
-				# mini-hack: convert string to bool here if necessary to show True/False instead of 0/1/t/f/etc.
-				self.output_mismatch_value(curr_obj, attrib, self.validation_attribs_shouldbe.currentText(), self.string_to_bool(expected_value) if isinstance(attrib_value, bool) else expected_value, attrib_value)
-				error_count += 1
-
-		self.output_error('Done (%s errors).' % error_count)
-	#end
-
-	def are_types_equal(self, a, b):
-		return type(a) == type(b)
-	#end
-
-	def are_equal(self, a, b):
-		if not self.are_types_equal(a, b):
-			self.output_error('Type mismatch in \'are_equal\' (%s, %s)! Returning False.' % (type(a), type(b)))
-			return False
-
-		if isinstance(a, int):
-			return a == b
-
-		if isinstance(a, float):
-			return abs(b - a) < 0.000001 # epsilon
-
-		if isinstance(a, bool):
-			return a == b
-
-		self.output_error('Type not covered in \'are_equal\' (%s)! Returning False.' % type(a))
-		return False
-	#end
-
-	def are_not_equal(self, a, b):
-		if not self.are_types_equal(a, b):
-			self.output_error('Type mismatch in \'are_not_equal\' (%s, %s)! Returning False.' % (type(a), type(b)))
-			return False
-
-		if isinstance(a, int):
-			return not (a == b)
-
-		if isinstance(a, float):
-			return not (abs(b - a) < 0.000001) # epsilon
-
-		if isinstance(a, bool):
-			return not (a == b)
-
-		self.output_error('Type not covered in \'are_not_equal\' (%s)! Returning False.' % type(a))
-		return False
-	#end
-	
-	def is_less(self, a, b):
-		if not self.are_types_equal(a, b):
-			self.output_error('Type mismatch in \'is_less\' (%s, %s)! Returning False.' % (type(a), type(b)))
-			return False
-		
-		if isinstance(a, int):
-			return a < b
-
-		if isinstance(a, float):
-			return a < b
-
-		if isinstance(a, bool):
-			return False # bools are either equal or not equal
-
-		self.output_error('Type not covered in \'is_less\' (%s)! Returning False.' % type(a))
-		return False
-	#end
-
-	def is_lequal(self, a, b):
-		if not self.are_types_equal(a, b):
-			self.output_error('Type mismatch in \'is_lequal\' (%s, %s)! Returning False.' % (type(a), type(b)))
-			return False
-		
-		if isinstance(a, int):
-			return a <= b
-
-		if isinstance(a, float):
-			return a < b or self.are_equal(a, b)
-
-		if isinstance(a, bool):
-			return a == b # can only check equality
-
-		self.output_error('Type not covered in \'is_lequal\' (%s)! Returning False.' % type(a))
-		return False
-	#end
-
-	def is_greater(self, a, b):
-		if not self.are_types_equal(a, b):
-			self.output_error('Type mismatch in \'is_greater\' (%s, %s)! Returning False.' % (type(a), type(b)))
-			return False
-		
-		if isinstance(a, int):
-			return a > b
-
-		if isinstance(a, float):
-			return a > b
-
-		if isinstance(a, bool):
-			return False # bools are either equal or not equal
-
-		self.output_error('Type not covered in \'is_greater\' (%s)! Returning False.' % type(a))
-		return False
-	#end
-
-	def is_grequal(self, a, b):
-		if not self.are_types_equal(a, b):
-			self.output_error('Type mismatch in \'is_grequal\' (%s, %s)! Returning False.' % (type(a), type(b)))
-			return False
-		
-		if isinstance(a, int):
-			return a >= b
-
-		if isinstance(a, float):
-			return a > b or self.are_equal(a, b)
-
-		if isinstance(a, bool):
-			return a == b # can only check equality
-
-		self.output_error('Type not covered in \'is_grequal\' (%s)! Returning False.' % type(a))
-		return False
-	#end
-
-	def string_to_bool(self, string):
-		return string.lower() in ['true', 't', 'yes', 'y', '1']
+		if len(attrib) and len(expected_value):
+			rules.append(checkercore.Rule(attrib, self.validation_attribs_shouldbe.currentText(), expected_value, description='custom attributes'))
+		return rules
 	#end
 
 	def get_current_attrib(self):
@@ -392,54 +338,39 @@ class ValueChecker(QtWidgets.QDialog):
 	#end
 
 	def update_attribs_combobox(self):
-		self.validation_attribs_combobox.clear()
-
-		all_attribs = set()
-		for curr_obj in self.get_filtered_objects():
-			obj_attributes = mc.listAttr(curr_obj, s=True) # only scalars (includes booleans and integer-based enums)
-			if None == obj_attributes:
-				continue
-			all_attribs = all_attribs | set(obj_attributes)
-		all_attribs = sorted(all_attribs)
-		
-		for curr in all_attribs:
-			self.validation_attribs_combobox.addItem(curr)
+		rows = self.get_filtered_rows()
+		names = self.pattern_model.names
+		with stageprofiler.stage('checker.listAttr'):
+			all_attribs = self.attrib_index.union([names[x] for x in rows], [self.pattern_types[x] for x in rows])
+		with stageprofiler.stage('checker.view'):
+			self.attribs_model.setStringList(sorted(all_attribs))
 	#end
 
-	def get_filtered_objects(self):
-		result = []
-
-		nothing_selected = (0 == len(self.pattern_lb.selectedItems()))
+	def get_filtered_rows(self):
+		selected_rows = self.pattern_lb.selectionModel().selectedRows()
+		if not len(selected_rows):
+			return range(len(self.pattern_model.names))
 
-		for idx in range(self.pattern_lb.count()):
-			item = self.pattern_lb.item(idx)
-			if nothing_selected or item.isSelected():
-				result.append(item.text())
+		return sorted(x.row() for x in selected_rows)
+	#end
 
-		return result
+	def get_filtered_objects(self):
+		return [self.pattern_model.names[row] for row in self.get_filtered_rows()]
 	#end
 
 	def update_filtered_objects(self, name_filter, type_filter):
-		self.pattern_lb.clear()
-		
-		to_add = []
-		for curr in mc.ls():
-			node_name = curr
-			node_type = mc.nodeType(curr)
-
-			# if len(name_filter) and name_filter not in node_name:
-			if len(name_filter) and re.search(name_filter, node_name) is None:
-				continue
-
-			# if len(type_filter) and type_filter not in node_type:
-			if len(type_filter) and re.search(type_filter, node_type) is None:
-				continue
-
-			to_add.append(curr)
-		#end
-
-		for curr in to_add:
-			self.pattern_lb.addItem(curr)
+		with stageprofiler.stage('checker.ls'):
+			snapshot = self.scene_index.snapshot()
+			names = snapshot.unique_names()
+		# compiled once, and typing more of a pattern only searches the previous matches
+		with stageprofiler.stage('checker.filter'):
+			indices = self.node_filter.filter(snapshot, name_filter, type_filter, names)
+			to_add = [names[x] for x in indices]
+			to_add_types = [snapshot.types[x] for x in indices]
+
+		self.pattern_types = to_add_types
+		with stageprofiler.stage('checker.view'):
+			self.pattern_model.set_names(to_add)
 
 		self.update_attribs_combobox()
 	#end